@@ -0,0 +1,178 @@
+"""Out-of-range alerts raised as readings are inserted.
+
+`process_readings` runs inside the insert transaction. For each user it
+keeps one compact `alert_state` row: the latest reading's time and glucose
+(the window for the rate-of-change check) and when each kind of alert last
+fired (for the cooldown). Every reading is checked in O(1) against that
+state, so history is never rescanned.
+
+Alerts are written to `alert_outbox` in the same transaction. The reminder
+leader drains the outbox on every heartbeat and emails the user. A sender
+claims rows before queueing their emails, so no other process (or a newly
+elected leader) sends them too, and a row is marked dispatched once its
+email has been delivered.
+"""
+import calendar
+import json
+import time
+from datetime import datetime
+import pytz
+from targets import TARGET_LOW, VERY_HIGH, VERY_LOW
+
+# Readings' wall-clock timestamps are in the app's timezone
+ALERT_TIMEZONE = pytz.timezone('Asia/Manila')
+
+# Only readings this recent raise alerts, so back-filled history stays quiet.
+# The log form defaults to the server's local clock while imports carry the
+# app timezone's, so a reading is recent if it is recent on either clock.
+MAX_READING_AGE = 6 * 3600
+# Minimum gap between two alerts of the same kind for one user
+COOLDOWN_SECONDS = 3600
+# An undelivered claim older than this is taken over by the next sender
+CLAIM_TIMEOUT = 900
+
+# Glucose moving faster than this (mg/dL per minute) between readings no
+# more than RATE_WINDOW seconds apart
+RAPID_CHANGE_RATE = 3.0
+RATE_WINDOW = 30 * 60
+
+# Hypertensive crisis (mmHg)
+BP_CRISIS_SYSTOLIC = 180
+BP_CRISIS_DIASTOLIC = 120
+
+# Alert kind -> cooldown column in alert_state
+COOLDOWN_COLUMNS = {
+    'severe_low': 'low_alert_ts',
+    'low': 'low_alert_ts',
+    'high': 'high_alert_ts',
+    'rapid_change': 'rate_alert_ts',
+    'bp_crisis': 'bp_alert_ts',
+}
+
+ALERT_SUBJECT = "[BUDDYBETES ALERT] Please check your latest reading"
+
+ALERT_MESSAGES = {
+    'severe_low': "Your glucose reading of {glucose:g} mg/dL is severely low (below {VERY_LOW} mg/dL). Treat it now and get help if needed.",
+    'low': "Your glucose reading of {glucose:g} mg/dL is low (below {TARGET_LOW} mg/dL).",
+    'high': "Your glucose reading of {glucose:g} mg/dL is very high (above {VERY_HIGH} mg/dL).",
+    'rapid_change': "Your glucose is changing rapidly: {glucose:g} mg/dL, {change:+g} mg/dL since your previous reading.",
+    'bp_crisis': "Your blood pressure reading of {bp_systolic}/{bp_diastolic} mmHg is in the hypertensive crisis range. Seek medical attention.",
+}
+
+STATE_COLUMNS = ('last_ts', 'last_glucose') + tuple(sorted(set(COOLDOWN_COLUMNS.values())))
+
+SAVE_STATE = f'''
+    INSERT OR REPLACE INTO alert_state (user_id, {', '.join(STATE_COLUMNS)})
+    VALUES (?, {', '.join('?' for _ in STATE_COLUMNS)})
+'''
+
+ENQUEUE_ALERT = '''
+    INSERT INTO alert_outbox (user_id, ts, kind, glucose_level, bp_systolic, bp_diastolic, change, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def wall_clock_now(now=None):
+    """The current time in the readings' wall-clock epoch encoding."""
+    moment = datetime.fromtimestamp(time.time() if now is None else now, ALERT_TIMEZONE)
+    return calendar.timegm(moment.timetuple())
+
+def server_clock_now(now=None):
+    """The current time on the server's local clock, in the same encoding."""
+    return calendar.timegm(time.localtime(now))
+
+def check_reading(state, ts, glucose, bp_systolic, bp_diastolic):
+    """Return (kind, change) alerts for one reading and advance `state` in place."""
+    alerts = []
+    change = None
+    # The log form stores 0 for a value that was left blank
+    if glucose > 0:
+        if glucose < VERY_LOW:
+            alerts.append('severe_low')
+        elif glucose < TARGET_LOW:
+            alerts.append('low')
+        elif glucose > VERY_HIGH:
+            alerts.append('high')
+        last_ts, last_glucose = state['last_ts'], state['last_glucose']
+        if last_ts is not None and 0 < ts - last_ts <= RATE_WINDOW:
+            change = glucose - last_glucose
+            if abs(change) / ((ts - last_ts) / 60) >= RAPID_CHANGE_RATE:
+                alerts.append('rapid_change')
+        if last_ts is None or ts > last_ts:
+            state['last_ts'], state['last_glucose'] = ts, glucose
+    if bp_systolic >= BP_CRISIS_SYSTOLIC or bp_diastolic >= BP_CRISIS_DIASTOLIC:
+        alerts.append('bp_crisis')
+
+    fired = []
+    for kind in alerts:
+        column = COOLDOWN_COLUMNS[kind]
+        if state[column] is None or ts - state[column] >= COOLDOWN_SECONDS:
+            state[column] = ts
+            fired.append((kind, change))
+    return fired
+
+def process_readings(conn, user_id, readings, now=None):
+    """Check inserted readings (tuples ordered like READING_COLUMNS) and queue alerts.
+
+    Runs in the caller's transaction. Returns the queued alerts as
+    (ts, kind, glucose, bp_systolic, bp_diastolic, change) tuples.
+    """
+    cutoff = min(wall_clock_now(now), server_clock_now(now)) - MAX_READING_AGE
+    row = conn.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM alert_state WHERE user_id = ?", (user_id,)).fetchone()
+    state = dict(zip(STATE_COLUMNS, row or (None,) * len(STATE_COLUMNS)))
+    before = dict(state)
+    queued = []
+    for reading in sorted(readings, key=lambda reading: reading[0]):
+        ts, glucose, bp_systolic, bp_diastolic = reading[:4]
+        if ts < cutoff:
+            continue
+        for kind, change in check_reading(state, ts, glucose or 0, bp_systolic or 0, bp_diastolic or 0):
+            queued.append((ts, kind, glucose, bp_systolic, bp_diastolic, change))
+    if state != before:
+        conn.execute(SAVE_STATE, (user_id, *(state[column] for column in STATE_COLUMNS)))
+    if queued:
+        created_at = int(time.time())
+        conn.executemany(ENQUEUE_ALERT, ((user_id, *alert, created_at) for alert in queued))
+    return queued
+
+def format_alert(kind, glucose, bp_systolic, bp_diastolic, change=None):
+    """The user-facing text of an alert."""
+    return ALERT_MESSAGES[kind].format(
+        glucose=glucose, bp_systolic=bp_systolic, bp_diastolic=bp_diastolic, change=change or 0,
+        VERY_LOW=VERY_LOW, TARGET_LOW=TARGET_LOW, VERY_HIGH=VERY_HIGH,
+    )
+
+def claim_alerts(conn, limit=500, now=None):
+    """Claim undispatched alerts for sending, oldest first.
+
+    Returns (id, attempts, email, name, kind, glucose, bp_systolic,
+    bp_diastolic, change) rows. A claim lasts until the alert is dispatched
+    or released; one older than CLAIM_TIMEOUT is assumed to belong to a
+    sender that died and can be claimed again. Commit before queueing the
+    emails so other senders see the claim.
+    """
+    now = int(time.time()) if now is None else now
+    claimed = conn.execute('''
+        UPDATE alert_outbox SET claimed_at = ?, attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM alert_outbox
+            WHERE dispatched_at IS NULL AND (claimed_at IS NULL OR claimed_at < ?)
+            ORDER BY id LIMIT ?
+        )
+        RETURNING id
+    ''', (now, now - CLAIM_TIMEOUT, limit)).fetchall()
+    if not claimed:
+        return []
+    return conn.execute('''
+        SELECT o.id, o.attempts, u.email, u.name, o.kind, o.glucose_level, o.bp_systolic, o.bp_diastolic, o.change
+        FROM alert_outbox o JOIN users u ON u.id = o.user_id
+        WHERE o.id IN (SELECT value FROM json_each(?))
+        ORDER BY o.id
+    ''', (json.dumps([alert_id for alert_id, in claimed]),)).fetchall()
+
+def release_alert(conn, alert_id):
+    """Drop a claim after a failed delivery so the next heartbeat retries the alert."""
+    conn.execute('UPDATE alert_outbox SET claimed_at = NULL WHERE id = ?', (alert_id,))
+
+def mark_dispatched(conn, alert_ids):
+    dispatched_at = int(time.time())
+    conn.executemany('UPDATE alert_outbox SET dispatched_at = ? WHERE id = ?', ((dispatched_at, alert_id) for alert_id in alert_ids))
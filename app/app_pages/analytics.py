@@ -1,66 +1,256 @@
+import tempfile
+from datetime import timedelta
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from database import create_connection
+from database import connection
+from health_data import DASHBOARD_QUERY, LAST_READING_QUERY, LOG_COLUMNS, LOG_PAGE_SIZE, MEAL_CONTEXTS, MOODS, count_logs, day_range_to_timestamps, fetch_log_page, from_timestamp, get_history_bounds
+from cache import analytics_cache, get_data_version
+from charts import pie_chart, symptoms_chart
+from downsample import downsample
+from export import EXPORT_COLUMNS, MAX_EXPORT_MB, export_readings
+from glycemic import TARGET_HIGH, TARGET_LOW, ambulatory_glucose_profile, mage, rollup_summary
+from rollups import CATEGORY_COUNTS_QUERY, DAILY_GLUCOSE_QUERY, DAY, HOURLY_SERIES_QUERY
+from symptom_tags import top_tag_counts
+
+# Days shown when the dashboard opens, ending at the latest reading
+DEFAULT_WINDOW_DAYS = 30
+
+# Windows longer than this chart hourly rollups instead of raw readings
+HOURLY_CHART_MIN_DAYS = 14
+# Raw readings are only read for the last days of a window, for MAGE and
+# the AGP (over the standard 14-day AGP period) and the short-range charts
+RAW_WINDOW_DAYS = HOURLY_CHART_MIN_DAYS
+
+def format_metric(value, pattern):
+    return "–" if pd.isna(value) else pattern.format(value)
+
+def load_category_counts(conn, username, category, start_ts, end_ts):
+    """Per-value reading counts of a category, read from the daily rollup."""
+    counts = pd.read_sql_query(CATEGORY_COUNTS_QUERY, conn, params=(username, category, start_ts, end_ts), index_col='value')
+    return counts['readings'].sort_values(ascending=False)
+
+def load_symptom_counts(conn, username, start_ts, end_ts):
+    """Days × top symptom tags matrix of reading counts, from the tag table."""
+    counts = pd.DataFrame(top_tag_counts(conn, username, start_ts, end_ts), columns=['day', 'tag', 'readings'])
+    counts['day'] = pd.to_datetime(counts['day'], unit='s')
+    return counts.pivot(index='day', columns='tag', values='readings').fillna(0)
+
+def load_hourly_series(conn, username, start_ts, end_ts):
+    hourly = pd.read_sql_query(HOURLY_SERIES_QUERY, conn, params=(username, start_ts, end_ts))
+    hourly['datetime'] = pd.to_datetime(hourly.pop('hour'), unit='s')
+    return hourly.set_index('datetime')
+
+def load_daily_glucose(conn, username, start_ts, end_ts):
+    daily = pd.read_sql_query(DAILY_GLUCOSE_QUERY, conn, params=(username, start_ts, end_ts))
+    daily['day'] = pd.to_datetime(daily.pop('day'), unit='s')
+    return daily.set_index('day')
+
+def build_dashboard(username, start_date, end_date):
+    """Query a window of a user's history and derive everything the dashboard displays.
+
+    Summary metrics and long-range charts read the rollups. Raw readings are
+    read for at most the window's last `RAW_WINDOW_DAYS`, so the cost grows
+    with the number of days rather than readings.
+    """
+    start_ts, end_ts = day_range_to_timestamps(start_date, end_date)
+    raw_start_ts = max(start_ts, end_ts - RAW_WINDOW_DAYS * DAY)
+    with connection() as conn:
+        cursor = conn.execute(LAST_READING_QUERY, (username, start_ts, end_ts))
+        last = cursor.fetchone()
+        if last is None:
+            return None
+        last = dict(zip((column[0] for column in cursor.description), last))
+        daily = load_daily_glucose(conn, username, start_ts, end_ts)
+        df = pd.read_sql_query(DASHBOARD_QUERY, conn, params=(username, raw_start_ts, end_ts))
+        mood_counts = load_category_counts(conn, username, 'mood', start_ts, end_ts)
+        meal_context_counts = load_category_counts(conn, username, 'meal_context', start_ts, end_ts)
+        symptom_counts = load_symptom_counts(conn, username, start_ts, end_ts)
+        if (end_date - start_date).days + 1 > HOURLY_CHART_MIN_DAYS:
+            series = load_hourly_series(conn, username, start_ts, end_ts)
+            glucose_series = series[['glucose_level', 'glucose_level_min', 'glucose_level_max']]
+        else:
+            series = None
+
+    df['datetime'] = pd.to_datetime(df.pop('ts'), unit='s')
+    df = df.set_index('datetime').sort_index()
+    if series is None:
+        series = df
+        glucose_series = df['glucose_level']
+
+    # Zero glucose values are blank form entries
+    recent_glucose = df['glucose_level'][df['glucose_level'] > 0]
+    glycemic = rollup_summary(daily)
+    glycemic['mage'] = mage(recent_glucose.to_numpy())
+    glycemic['agp'] = ambulatory_glucose_profile(recent_glucose) if len(recent_glucose) else pd.DataFrame()
+
+    return {
+        'last': last,
+        'last_entry_date': from_timestamp(last['ts']).strftime('%Y-%m-%d %H:%M:%S'),
+        'recent_days': (end_ts - raw_start_ts) // DAY,
+        'glucose_series': downsample(glucose_series),
+        'bp_series': downsample(series[['bp_systolic', 'bp_diastolic']]),
+        'glycemic': glycemic,
+        'mood_chart': pie_chart(mood_counts),
+        'symptoms_chart': symptoms_chart(symptom_counts),
+        'meal_context_chart': pie_chart(meal_context_counts),
+    }
 
 def analytics_dashboard(username):
     st.subheader("Analytics Dashboard")
 
-    conn = create_connection()
-    query = "SELECT date, time, glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context FROM health_data WHERE user_id = ? ORDER BY date DESC, time DESC"
-    df = pd.read_sql_query(query, conn, params=(username,))
-    conn.close()
-
-    if df.empty:
+    version = get_data_version(username)
+    first, last = analytics_cache.get_or_compute(
+        (username, version, 'bounds'),
+        lambda: get_history_bounds(username),
+    )
+    if first is None:
         st.write("No data available. Please log some health data.")
-    else:
-        df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        df.set_index('datetime', inplace=True)
+        return
+
+    default_start = max(first.date(), last.date() - timedelta(days=DEFAULT_WINDOW_DAYS - 1))
+    date_range = st.date_input("Date Range", value=(default_start, last.date()), key="analytics_date_range")
+    if len(date_range) != 2:
+        st.info("Select the end date of the range.")
+        return
+    start_date, end_date = date_range
 
+    # Reruns with unchanged data reuse the cached bundle: no SQL, no plotting
+    dashboard = analytics_cache.get_or_compute(
+        (username, version, start_date, end_date),
+        lambda: build_dashboard(username, start_date, end_date),
+    )
+
+    if dashboard is None:
+        st.write("No health data logged in the selected date range.")
+    else:
         # Overview
         st.write("## Overview")
-        last_glucose_level = df['glucose_level'].iloc[0]
-        last_bp_systolic = df['bp_systolic'].iloc[0]
-        last_bp_diastolic = df['bp_diastolic'].iloc[0]
-        last_meal = df['food_intake'].iloc[0]
-        last_entry_date = df.index[0].strftime('%Y-%m-%d %H:%M:%S')
+        last_glucose_level = dashboard['last']['glucose_level']
+        last_bp_systolic = dashboard['last']['bp_systolic']
+        last_bp_diastolic = dashboard['last']['bp_diastolic']
+        last_meal = dashboard['last']['food_intake']
+        last_entry_date = dashboard['last_entry_date']
 
         col1, col2, col3 = st.columns(3)
         col1.markdown(f"<h3>Last Recorded Glucose Level</h3><h1>{last_glucose_level}</h1><p style='font-size:small;'>{last_entry_date}</p>", unsafe_allow_html=True)
         col2.markdown(f"<h3>Last Recorded Blood Pressure</h3><h1>{last_bp_systolic}/{last_bp_diastolic}</h1><p style='font-size:small;'>{last_entry_date}</p>", unsafe_allow_html=True)
         col3.markdown(f"<h3>Last Recorded Meal</h3><h1>{last_meal}</h1><p style='font-size:small;'>{last_entry_date}</p>", unsafe_allow_html=True)
 
+        # Glycemic Metrics
+        st.write("## Glycemic Metrics")
+        glycemic = dashboard['glycemic']
+        ranges = glycemic['ranges']
+        col1, col2, col3 = st.columns(3)
+        col1.metric(f"Time in Range ({TARGET_LOW}-{TARGET_HIGH})", format_metric(ranges['in_range'], "{:.0%}"))
+        col2.metric(f"Time Below {TARGET_LOW}", format_metric(ranges['below'], "{:.0%}"))
+        col3.metric(f"Time Above {TARGET_HIGH}", format_metric(ranges['above'], "{:.0%}"))
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Glucose Management Indicator", format_metric(glycemic['gmi'], "{:.1f}%"))
+        col2.metric("Coefficient of Variation", format_metric(glycemic['cv'], "{:.1f}%"))
+        col3.metric(f"MAGE, last {dashboard['recent_days']} days (mg/dL)", format_metric(glycemic['mage'], "{:.0f}"))
+
+        st.write(f"### Ambulatory Glucose Profile (last {dashboard['recent_days']} days)")
+        st.line_chart(glycemic['agp'])
+
+        st.write("### Daily Glucose Mean and SD")
+        st.line_chart(glycemic['daily'][['mean', 'std']])
+
         # Glucose Levels Over Time
         st.write("## Glucose Levels Over Time")
-        st.line_chart(df['glucose_level'])
+        st.line_chart(dashboard['glucose_series'])
 
         # Blood Pressure Over Time
         st.write("## Blood Pressure Over Time")
-        st.line_chart(df[['bp_systolic', 'bp_diastolic']])
+        st.line_chart(dashboard['bp_series'])
 
         # Mood Distribution
         st.write("## Mood Distribution")
-        mood_counts = df['mood'].value_counts()
-        fig, ax = plt.subplots()
-        ax.pie(mood_counts, labels=mood_counts.index, autopct='%1.1f%%', startangle=140)
-        ax.axis('equal')
-        st.pyplot(fig)
+        st.image(dashboard['mood_chart'])
 
-        # Symptoms Over Time (Stacked Bar Chart)
+        # Symptoms Over Time (daily counts of the most frequent tags)
         st.write("## Symptoms Over Time")
-        symptoms_counts = df.groupby(['datetime', 'symptoms']).size().unstack(fill_value=0)
-        fig, ax = plt.subplots()
-        symptoms_counts.plot(kind='bar', stacked=True, ax=ax)
-        st.pyplot(fig)
+        st.image(dashboard['symptoms_chart'])
 
         # Meal Context Distribution
         st.write("## Meal Context Distribution")
-        meal_context_counts = df['meal_context'].value_counts()
-        fig, ax = plt.subplots()
-        ax.pie(meal_context_counts, labels=meal_context_counts.index, autopct='%1.1f%%', startangle=140)
-        ax.axis('equal')
-        st.pyplot(fig)
+        st.image(dashboard['meal_context_chart'])
 
         # All Health Logs
         st.write("## All Health Logs")
-        st.dataframe(df.reset_index())  # Display the dataframe with the health logs
+        health_logs_browser(username, version, *day_range_to_timestamps(start_date, end_date))
+
+        # Export
+        st.write("## Export Your Data")
+        export_section(username, start_date, end_date)
+
+def health_logs_browser(username, version, start_ts, end_ts):
+    """Show the logs one keyset-paginated page at a time."""
+    col1, col2, col3 = st.columns(3)
+    mood = col1.selectbox("Mood", ["All"] + MOODS, key="logs_mood")
+    meal_context = col2.selectbox("Meal Context", ["All"] + MEAL_CONTEXTS, key="logs_meal_context")
+    search = col3.text_input("Search food and symptoms", key="logs_search").strip()
+    filters = {
+        'mood': None if mood == "All" else mood,
+        'meal_context': None if meal_context == "All" else meal_context,
+        'search': search or None,
+    }
+
+    # Cursors of the pages visited so far; reset whenever the query changes
+    query_key = (username, version, start_ts, end_ts, tuple(filters.values()))
+    if st.session_state.get('logs_query') != query_key:
+        st.session_state['logs_query'] = query_key
+        st.session_state['logs_cursors'] = [None]
+    cursors = st.session_state['logs_cursors']
+
+    total = analytics_cache.get_or_compute(
+        (username, version, 'log_count', start_ts, end_ts, *filters.values()),
+        lambda: count_logs(username, start_ts, end_ts, **filters),
+    )
+    rows, next_cursor = analytics_cache.get_or_compute(
+        (username, version, 'log_page', start_ts, end_ts, *filters.values(), cursors[-1]),
+        lambda: fetch_log_page(username, start_ts, end_ts, after=cursors[-1], **filters),
+    )
+
+    page = pd.DataFrame.from_records(rows, columns=LOG_COLUMNS)
+    page['datetime'] = pd.to_datetime(page.pop('ts'), unit='s')
+    st.dataframe(page.set_index('datetime').drop(columns='id'))
+
+    # Callbacks run before the next rerun, so the new page renders right away
+    col1, col2, col3 = st.columns([1, 2, 1])
+    col1.button("Previous", disabled=len(cursors) == 1, key="logs_previous", on_click=cursors.pop)
+    col2.markdown(f"Page {len(cursors)} of {max(-(-total // LOG_PAGE_SIZE), 1)} ({total} entries)")
+    col3.button("Next", disabled=next_cursor is None, key="logs_next", on_click=cursors.append, args=(next_cursor,))
+
+def export_section(username, start_date, end_date):
+    """Stream the user's readings to a temporary file and offer it for download."""
+    with st.form(key='export_form'):
+        file_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True)
+        columns = st.multiselect("Columns", EXPORT_COLUMNS, default=list(EXPORT_COLUMNS))
+        in_range = st.checkbox(f"Only {start_date} to {end_date}", value=True)
+        st.caption(f"Exports are limited to {MAX_EXPORT_MB} MB. For more, export a shorter date range or fewer columns.")
+        export_button = st.form_submit_button(label="Prepare Export")
+
+    if export_button:
+        if not columns:
+            st.error("Select at least one column to export.")
+            return
+        start_ts, end_ts = day_range_to_timestamps(start_date, end_date) if in_range else (None, None)
+        extension = file_format.lower()
+        try:
+            with tempfile.TemporaryFile() as file:
+                rows = export_readings(
+                    username, file, extension, start_ts, end_ts, [c for c in EXPORT_COLUMNS if c in columns],
+                    max_bytes=MAX_EXPORT_MB * 1024 * 1024,
+                )
+                # Generation streams through the file; Streamlit copies it
+                # into its media storage to serve the download. The seek
+                # flushes the buffer so the raw file is complete.
+                file.seek(0)
+                st.download_button(
+                    f"Download {rows} readings",
+                    data=file.raw,
+                    file_name=f"buddybetes_{username}.{extension}",
+                    mime='text/csv' if extension == 'csv' else 'application/vnd.apache.parquet',
+                )
+        except Exception as e:
+            st.error(f"An error occurred while exporting: {e}")
@@ -0,0 +1,56 @@
+import time
+import streamlit as st
+import pandas as pd
+import metrics
+from cache import cache_stats
+from health_data import health_writer
+
+def histogram_table(histogram, rows_counter=None):
+    """One row per label set with count and latency percentiles in milliseconds."""
+    rows_by_key = rows_counter.values() if rows_counter is not None else {}
+    table = []
+    for key, summary in histogram.summary().items():
+        row = dict(zip(histogram.labelnames, key))
+        row['count'] = summary['count']
+        for name in ('mean', 'p50', 'p95', 'p99', 'max'):
+            row[f'{name} (ms)'] = round(summary[name] * 1000, 2)
+        if rows_counter is not None:
+            row['rows/exec'] = round(rows_by_key.get(key, 0) / summary['count'], 1)
+        table.append(row)
+    if not table:
+        return None
+    return pd.DataFrame(table).sort_values('p95 (ms)', ascending=False)
+
+def show_histogram(title, histogram, rows_counter=None):
+    st.write(f"### {title}")
+    table = histogram_table(histogram, rows_counter)
+    if table is None:
+        st.write("No samples yet.")
+    else:
+        st.dataframe(table, hide_index=True)
+
+def diagnostics():
+    st.subheader("Diagnostics")
+    st.caption("Metrics of this server process since it started. Percentiles cover the most recent samples.")
+
+    show_histogram("Pages", metrics.page_seconds)
+    show_histogram("SQL statements", metrics.db_statement_seconds, metrics.db_statement_rows)
+
+    st.write(f"### Slow queries (≥ {metrics.SLOW_QUERY_SECONDS * 1000:.0f} ms)")
+    slow = list(metrics.slow_queries)
+    if slow:
+        st.dataframe(pd.DataFrame(
+            [(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(at)), round(seconds * 1000, 1), sql) for at, seconds, sql in reversed(slow)],
+            columns=['at', 'ms', 'statement'],
+        ), hide_index=True)
+    else:
+        st.write("None recorded.")
+
+    show_histogram("Reminder scheduler", metrics.scheduler_seconds)
+    show_histogram("SMTP", metrics.smtp_seconds)
+    show_histogram("health_data group commits", metrics.writer_commit_seconds)
+
+    st.write("### Writer and caches")
+    st.json({'writer': health_writer.stats(), **cache_stats()})
+
+    st.download_button("Download Prometheus metrics", metrics.render_prometheus(), file_name="buddybetes.prom", mime="text/plain")
@@ -1,5 +1,8 @@
 import streamlit as st
-from database import create_connection
+import pandas as pd
+from alerts import format_alert
+from bulk_import import import_readings
+from health_data import MEAL_CONTEXTS, MOODS, insert_reading
 
 def log_data_form(username):
     st.subheader("Log Your Health Data")
@@ -11,9 +14,9 @@ def log_data_form(username):
         glucose_level_str = st.text_input("Glucose Level (mg/dL)", placeholder="70")
         bp_systolic_str = st.text_input("Blood Pressure (Systolic) (mmHg)", placeholder="180")
         bp_diastolic_str = st.text_input("Blood Pressure (Diastolic) (mmHg)", placeholder="20")
-        meal_context = st.selectbox("Meal Context", ["Before Breakfast", "After Breakfast", "Before Lunch", "After Lunch", "Before Dinner", "After Dinner", "Other"])
+        meal_context = st.selectbox("Meal Context", MEAL_CONTEXTS)
         food_intake = st.text_area("Food Intake", placeholder="Describe your food intake")
-        mood = st.selectbox("Mood", ["Happy", "Sad", "Neutral", "Anxious", "Stressed"])
+        mood = st.selectbox("Mood", MOODS)
         symptoms = st.text_area("Symptoms", placeholder="Describe any symptoms")
 
         submit_button = st.form_submit_button(label="Submit")
@@ -25,16 +28,39 @@ def log_data_form(username):
             bp_systolic = int(bp_systolic_str) if bp_systolic_str else 0
             bp_diastolic = int(bp_diastolic_str) if bp_diastolic_str else 0
 
-            conn = create_connection()
-            c = conn.cursor()
-            c.execute('''
-                INSERT INTO health_data (user_id, date, time, glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (username, date.strftime('%Y-%m-%d'), time.strftime('%H:%M:%S'), glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context))
-            conn.commit()
-
-            conn.close()
+            raised_alerts = insert_reading(username, date, time, glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context)
             st.success("Health data logged successfully!")
+            for ts, kind, glucose, systolic, diastolic, change in raised_alerts:
+                st.warning(format_alert(kind, glucose, systolic, diastolic, change))
         except Exception as e:
             st.error(f"An error occurred: {e}")
 
+    bulk_import_form(username)
+
+def bulk_import_form(username):
+    st.subheader("Import Meter or CGM Data")
+    st.markdown("Upload a CSV, JSON or JSON Lines export with a timestamp and a glucose value per reading. Readings that are already logged are skipped.")
+
+    with st.form(key='bulk_import_form'):
+        uploaded_file = st.file_uploader("Export File", type=['csv', 'json', 'jsonl'])
+        import_button = st.form_submit_button(label="Import")
+
+    if import_button and uploaded_file is not None:
+        file_format = 'csv' if uploaded_file.name.lower().endswith('.csv') else 'json'
+        size = max(uploaded_file.size, 1)
+        progress_bar = st.progress(0.0, text="Importing...")
+
+        def show_progress(report):
+            progress_bar.progress(min(uploaded_file.tell() / size, 1.0), text=f"Imported {report['inserted']} of {report['rows']} rows...")
+
+        try:
+            report = import_readings(username, uploaded_file, file_format, progress=show_progress)
+        except Exception as e:
+            st.error(f"An error occurred while importing: {e}")
+            return
+
+        progress_bar.progress(1.0, text="Import finished")
+        st.success(f"Imported {report['inserted']} readings ({report['duplicates']} duplicates skipped).")
+        if report['error_count']:
+            st.warning(f"{report['error_count']} rows could not be imported.")
+            st.dataframe(pd.DataFrame(report['errors'], columns=["Row", "Error"]), hide_index=True)
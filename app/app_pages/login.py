@@ -1,5 +1,6 @@
 import streamlit as st
 from auth import authenticate
+from passwords import LoginThrottled, PasswordServiceBusy
 
 def login_user():
     st.subheader("Login to Your Account")
@@ -11,7 +12,7 @@ def login_user():
 
     if submit_button:
         try:
-            auth_status, name, user = authenticate(username, password)
+            auth_status, name, user = authenticate(username, password, client_ip=st.context.ip_address)
             if auth_status:
                 st.session_state['authentication_status'] = True
                 st.session_state['name'] = name
@@ -21,12 +22,14 @@ def login_user():
 
                 # Redirect to Analytics page after successful login
                 st.session_state['page'] = 'Analytics'
-                st.experimental_rerun()  # Force a rerun to navigate to Analytics
+                st.rerun()  # Force a rerun to navigate to Analytics
             else:
                 st.error('Incorrect username or password. Please try again.')
+        except (LoginThrottled, PasswordServiceBusy) as e:
+            st.error(str(e))
         except Exception as e:
             st.error(f"An error occurred during login: {e}")
 
     if st.button("Create new account here"):
         st.session_state['page'] = 'Register'
-        st.experimental_rerun()  # Force a rerun to navigate to Register
+        st.rerun()  # Force a rerun to navigate to Register
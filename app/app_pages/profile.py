@@ -1,12 +1,12 @@
 import streamlit as st
 import pandas as pd  # Import pandas
-from auth import get_user_info, update_user_info
-from database import create_connection
+from auth import session_user_info, update_user_info
+from email_notifications import reschedule_reminder
 
 def profile_management(username):
     st.subheader("Manage Your Profile")
 
-    user_info = get_user_info(username)
+    user_info = session_user_info(username)
     if user_info:
         with st.form(key='profile_form'):
             new_username = st.text_input("Username", value=user_info[0], placeholder="Enter your new username")
@@ -18,19 +18,8 @@ def profile_management(username):
 
         if submit_button:
             try:
-                if new_username != username:
-                    # Update username in the database
-                    conn = create_connection()
-                    c = conn.cursor()
-                    c.execute('''
-                        UPDATE health_data
-                        SET user_id = ?
-                        WHERE user_id = ?
-                    ''', (new_username, username))
-                    conn.commit()
-                    conn.close()
-
                 update_user_info(username, new_username, email, name, email_reminder, reminder_time.strftime('%H:%M'))
+                reschedule_reminder(new_username, old_username=username)
                 st.session_state['username'] = new_username
                 st.success("Profile updated successfully!")
             except Exception as e:
@@ -1,9 +1,8 @@
 import streamlit as st
 from auth import authenticate
-from database import create_connection
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from database import connection
+from email_notifications import reschedule_reminder
+from passwords import hash_password
 
 def register_user():
     st.subheader("Create New Account")
@@ -20,24 +19,28 @@ def register_user():
         if password != confirm_password:
             st.error("Passwords do not match")
         else:
-            hashed_password = pwd_context.hash(password)
             try:
-                conn = create_connection()
-                c = conn.cursor()
-                c.execute('SELECT COUNT(*) FROM users WHERE username = ?', (username,))
-                if c.fetchone()[0] > 0:
-                    st.error("Username already exists. Please choose a different username.")
-                else:
-                    c.execute('''
-                        INSERT INTO users (username, email, name, password, email_reminder, reminder_time)
-                        VALUES (?, ?, ?, ?, 'Daily', '07:58')
-                    ''', (username, email, name, hashed_password))
-                    conn.commit()
+                hashed_password = hash_password(password)
+                registered = False
+                with connection() as conn:
+                    c = conn.cursor()
+                    c.execute('SELECT COUNT(*) FROM users WHERE username = ?', (username,))
+                    if c.fetchone()[0] > 0:
+                        st.error("Username already exists. Please choose a different username.")
+                    else:
+                        c.execute('''
+                            INSERT INTO users (username, email, name, password, email_reminder, reminder_time)
+                            VALUES (?, ?, ?, ?, 'Daily', '07:58')
+                        ''', (username, email, name, hashed_password))
+                        registered = True
+                if registered:
+                    # New accounts get the default daily reminder; tell the
+                    # reminder leader once the user row has committed
+                    reschedule_reminder(username)
                     st.success("User registered successfully! Please log in.")
-                conn.close()
             except Exception as e:
                 st.error(f"An error occurred while registering the user: {e}")
     
     if st.button("Have an account? Login Here"):
         st.session_state['page'] = 'Login'
-        st.experimental_rerun()  # Force a rerun to navigate to Login
+        st.rerun()  # Force a rerun to navigate to Login
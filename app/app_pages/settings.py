@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
-from email_notifications import schedule_email, load_reminder_settings
-from database import create_connection
+from auth import session_user_info, update_reminder_settings
+from email_notifications import reschedule_reminder
 
 def settings(username):
     st.subheader("Email Notification Reminder")
 
     # Load existing settings
-    email_reminder, reminder_time = load_reminder_settings(username)
+    user_info = session_user_info(username)
+    email_reminder, reminder_time = (user_info[4], user_info[5]) if user_info else ('None', '12:00')
 
     with st.form(key='settings_form'):
         email_reminder = st.selectbox(
@@ -25,19 +26,11 @@ def settings(username):
 
     if submit_button:
         try:
-            conn = create_connection()
-            c = conn.cursor()
-            c.execute('''
-                UPDATE users
-                SET email_reminder = ?, reminder_time = ?
-                WHERE username = ?
-            ''', (email_reminder, reminder_time.strftime('%H:%M'), username))
-            conn.commit()
-            conn.close()
+            update_reminder_settings(username, email_reminder, reminder_time.strftime('%H:%M'))
 
             st.success("Reminder settings saved successfully!")
 
-            # Cancel any existing schedule
-            schedule_email(username, "[BUDDYBETES REMINDER] Reminder to log your Health Data!", "This is your BuddyBetes reminder to log your health data.")
+            # Replace any existing schedule with the new settings
+            reschedule_reminder(username)
         except Exception as e:
             st.error(f"An error occurred while saving the settings: {e}")
@@ -1,35 +1,112 @@
-import sqlite3
-from passlib.context import CryptContext
-from database import create_connection
+import hashlib
+import hmac
+import os
+import secrets
+import time
+import streamlit as st
+from database import connection
+from cache import credential_cache, discard_user_data, get_user_version, invalidate_user, session_user_hits, user_cache
+from passwords import login_throttle, password_service
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Column order of the tuples returned by get_user_info
+USER_COLUMNS = 'username, email, name, password, email_reminder, reminder_time'
 
-def authenticate(username, password):
-    conn = create_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username = ?', (username,))
-    user = c.fetchone()
-    conn.close()
+# Usernames allowed to open the diagnostics page
+ADMIN_USERNAMES = {name.strip() for name in os.environ.get('BUDDYBETES_ADMINS', '').split(',') if name.strip()}
 
-    if user and pwd_context.verify(password, user[3]):  # Assuming password is the 4th column
-        return True, user[2], user[0]  # Assuming name is the 3rd column, username is the 1st column
+# How long a verified API credential skips bcrypt
+CREDENTIAL_TTL = 15 * 60
+# Process-local key for credential digests, so the cache never holds
+# anything that could be checked against a password offline
+_credential_key = secrets.token_bytes(32)
+
+def authenticate(username, password, client_ip=None):
+    """Check a login; raises LoginThrottled after too many recent failures.
+
+    Hashes made with an outdated bcrypt cost are upgraded on success.
+    """
+    throttle_keys = (('user', username), ('ip', client_ip) if client_ip else None)
+    login_throttle.check(*throttle_keys)
+    with connection() as conn:
+        user = conn.execute(f'SELECT {USER_COLUMNS} FROM users WHERE username = ?', (username,)).fetchone()
+
+    if user:
+        user_cache.put(username, user)
+        verified, new_hash = password_service.verify(password, user[3])  # password is the 4th column
+        if verified:
+            login_throttle.succeeded(('user', username))
+            if new_hash:
+                with connection() as conn:
+                    conn.execute('UPDATE users SET password = ? WHERE username = ? AND password = ?', (new_hash, username, user[3]))
+                invalidate_user(username)
+            return True, user[2], user[0]  # name is the 3rd column, username is the 1st column
+    login_throttle.failed(*throttle_keys)
     return False, None, None
 
+def is_admin(username):
+    return username in ADMIN_USERNAMES
+
+def _stored_hash(username):
+    with connection() as conn:
+        row = conn.execute('SELECT password FROM users WHERE username = ?', (username,)).fetchone()
+    return row[0] if row else None
+
+def authenticate_cached(username, password, client_ip=None):
+    """authenticate() for API clients that send credentials with every request.
+
+    A successful check is remembered for CREDENTIAL_TTL seconds, and only
+    while the user's stored hash is unchanged, so repeat requests cost one
+    indexed lookup instead of a bcrypt verify. Returns True or False.
+    """
+    digest = hmac.new(_credential_key, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+    cached = credential_cache.get(digest)
+    if cached is not None and cached[1] > time.monotonic() and cached[0] == _stored_hash(username):
+        return True
+    verified, _, _ = authenticate(username, password, client_ip)
+    if verified:
+        # Read back the hash, which authenticate() may just have upgraded
+        credential_cache.put(digest, (_stored_hash(username), time.monotonic() + CREDENTIAL_TTL))
+    return verified
+
 def get_user_info(username):
-    conn = create_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username = ?', (username,))
-    user = c.fetchone()
-    conn.close()
+    """The user's row (ordered like USER_COLUMNS) or None, from the process cache."""
+    user = user_cache.get(username)
+    if user is None:
+        with connection() as conn:
+            user = conn.execute(f'SELECT {USER_COLUMNS} FROM users WHERE username = ?', (username,)).fetchone()
+        # Unknown users are not cached, so a later registration is seen at once
+        if user is not None:
+            user_cache.put(username, user)
+    return user
+
+def session_user_info(username):
+    """get_user_info, memoized in the session until the user's record changes."""
+    version = get_user_version(username)
+    cached = st.session_state.get('user_record')
+    if cached is not None and cached[:2] == (username, version):
+        session_user_hits.record(True)
+        return cached[2]
+    session_user_hits.record(False)
+    user = get_user_info(username)
+    if user is not None:
+        st.session_state['user_record'] = (username, version, user)
     return user
 
 def update_user_info(old_username, new_username, email, name, email_reminder, reminder_time):
-    conn = create_connection()
-    c = conn.cursor()
-    c.execute('''
-        UPDATE users
-        SET username = ?, email = ?, name = ?, email_reminder = ?, reminder_time = ?
-        WHERE username = ?
-    ''', (new_username, email, name, email_reminder, reminder_time, old_username))
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        conn.execute('''
+            UPDATE users
+            SET username = ?, email = ?, name = ?, email_reminder = ?, reminder_time = ?
+            WHERE username = ?
+        ''', (new_username, email, name, email_reminder, reminder_time, old_username))
+    invalidate_user(old_username, new_username)
+    discard_user_data(old_username, new_username)
+
+def update_reminder_settings(username, email_reminder, reminder_time):
+    with connection() as conn:
+        conn.execute('''
+            UPDATE users
+            SET email_reminder = ?, reminder_time = ?
+            WHERE username = ?
+        ''', (email_reminder, reminder_time, username))
+    invalidate_user(username)
@@ -0,0 +1,247 @@
+"""Streaming bulk import of glucometer and CGM exports.
+
+Files are parsed record by record (CSV, JSON Lines or a JSON array), so an
+upload is never held in memory as a whole. Valid rows are normalized into
+health_data readings and inserted in large `executemany` batches through
+`health_data.insert_readings`, which skips readings that are already stored.
+"""
+import codecs
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from functools import lru_cache
+from alerts import wall_clock_now
+from health_data import EPOCH, MEAL_CONTEXTS, MOODS, READING_COLUMNS, insert_readings
+
+BATCH_SIZE = 20000
+MAX_REPORTED_ERRORS = 100
+
+# Plausible glucose readings in mg/dL
+GLUCOSE_MIN = 10
+GLUCOSE_MAX = 1000
+MMOL_TO_MGDL = 18.016
+
+# Accepted column names, most specific first
+TIMESTAMP_FIELDS = ('timestamp', 'datetime', 'dateString', 'Device Timestamp', 'Timestamp (YYYY-MM-DDThh:mm:ss)')
+GLUCOSE_FIELDS = ('glucose_level', 'glucose', 'sgv', 'Glucose Value (mg/dL)', 'Historic Glucose mg/dL', 'value')
+UNIT_FIELDS = ('units', 'unit', 'Unit')
+
+# Labels the log form offers, keyed by lowercase spelling
+LABELS = {
+    'mood': {mood.lower(): mood for mood in MOODS},
+    'meal_context': {context.lower(): context for context in MEAL_CONTEXTS},
+}
+
+_ONE_SECOND = timedelta(seconds=1)
+_CHUNK_CHARS = 64 * 1024
+
+def iter_csv_records(stream, encoding='utf-8-sig'):
+    """Yield the header, then (line number, row list) for each CSV row of a binary stream."""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding=encoding, newline=''))
+    yield next(reader, [])
+    for row in reader:
+        if row:
+            yield reader.line_num, row
+
+def iter_json_records(stream, encoding='utf-8-sig'):
+    """Yield (record number, value) from a JSON array or JSON Lines stream.
+
+    Objects are decoded one at a time from a sliding text buffer, so memory
+    stays proportional to the largest record rather than to the file.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder(encoding)()
+    buffer = ''
+    position = 0
+    number = 0
+    eof = False
+    while True:
+        # Skip whitespace and the array punctuation between records
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                return
+            buffer, position = text.decode(stream.read(_CHUNK_CHARS), final=False), 0
+            if not buffer:
+                eof = True
+                buffer = text.decode(b'', final=True)
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if eof:
+                # Malformed or truncated input: hand the error to the caller
+                # as the final record rather than losing the rows before it
+                yield number + 1, e
+                return
+            chunk = stream.read(_CHUNK_CHARS)
+            if not chunk:
+                eof = True
+            buffer = buffer[position:] + text.decode(chunk, final=eof)
+            position = 0
+            continue
+        number += 1
+        yield number, record
+        position = end
+
+def resolve_columns(fieldnames):
+    """Map each reading field to the export column that supplies it.
+
+    The result is computed once per file (or per JSON record shape) and
+    holds keys that index the parsed records directly: column positions for
+    CSV rows, names for JSON objects.
+    """
+    def pick(*names):
+        for name in names:
+            if name in fieldnames:
+                return fieldnames.index(name) if isinstance(fieldnames, list) else name
+        return None
+
+    return {
+        'timestamp': pick(*TIMESTAMP_FIELDS),
+        'date': pick('date'),
+        'time': pick('time'),
+        'glucose': pick(*GLUCOSE_FIELDS),
+        'unit': pick(*UNIT_FIELDS),
+        **{name: pick(name) for name in READING_COLUMNS[2:]},
+    }
+
+def _value(record, key):
+    if key is None:
+        return None
+    try:
+        value = record[key]
+    except (KeyError, IndexError):
+        return None
+    return None if value == '' else value
+
+@lru_cache(maxsize=4096)
+def _utc_offset(day):
+    """The app timezone's UTC offset throughout a UTC day, or None if it changes that day."""
+    start, end = day * 86400, day * 86400 + 86399
+    offset = wall_clock_now(start) - start
+    return offset if wall_clock_now(end) - end == offset else None
+
+def _to_wall_clock(seconds):
+    """App-timezone wall clock of an absolute epoch instant."""
+    offset = _utc_offset(seconds // 86400)
+    return seconds + offset if offset is not None else wall_clock_now(seconds)
+
+def parse_timestamp(value):
+    """Epoch seconds of an export timestamp.
+
+    Accepts ISO 8601 strings or epoch numbers in seconds or milliseconds.
+    Epoch numbers and ISO strings with an offset or `Z` are absolute
+    instants, so they are converted to the app timezone's wall clock like
+    every stored reading. Naive ISO strings are already the device's wall
+    clock and are kept as they are.
+    """
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, (int, float)):
+        seconds = int(value)
+        if seconds > 10 ** 11:
+            seconds //= 1000
+        return _to_wall_clock(seconds)
+    moment = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    wall_clock = (moment.replace(tzinfo=None) - EPOCH) // _ONE_SECOND
+    if moment.utcoffset() is None:
+        return wall_clock
+    return _to_wall_clock(wall_clock - moment.utcoffset() // _ONE_SECOND)
+
+def _label(record, columns, field):
+    """A mood or meal context in the log form's spelling, or None if blank."""
+    value = _value(record, columns[field])
+    if value is None:
+        return None
+    label = LABELS[field].get(str(value).strip().lower())
+    if label is None:
+        expected = ', '.join(LABELS[field].values())
+        raise ValueError(f"unknown {field.replace('_', ' ')} {value!r} (expected one of {expected})")
+    return label
+
+def normalize_record(record, columns):
+    """Turn a parsed record into a health_data reading tuple, or raise ValueError."""
+    value = _value(record, columns['timestamp'])
+    if value is None:
+        value = _value(record, columns['date'])
+        if value is None:
+            raise ValueError("missing timestamp")
+        time_of_day = _value(record, columns['time'])
+        if time_of_day is not None:
+            value = f"{value} {time_of_day}"
+    ts = parse_timestamp(value)
+
+    glucose = _value(record, columns['glucose'])
+    if glucose is None:
+        raise ValueError("missing glucose value")
+    glucose = float(glucose)
+    unit = _value(record, columns['unit'])
+    if unit is not None and 'mmol' in str(unit).lower():
+        glucose = round(glucose * MMOL_TO_MGDL, 1)
+    if not GLUCOSE_MIN <= glucose <= GLUCOSE_MAX:
+        raise ValueError(f"glucose {glucose:g} mg/dL out of range")
+
+    bp_systolic = _value(record, columns['bp_systolic'])
+    bp_diastolic = _value(record, columns['bp_diastolic'])
+    return (
+        ts,
+        glucose,
+        int(float(bp_systolic)) if bp_systolic is not None else 0,
+        int(float(bp_diastolic)) if bp_diastolic is not None else 0,
+        _value(record, columns['food_intake']),
+        _label(record, columns, 'mood'),
+        _value(record, columns['symptoms']),
+        _label(record, columns, 'meal_context'),
+    )
+
+def import_readings(username, stream, file_format, batch_size=BATCH_SIZE, progress=None):
+    """Stream-import readings for `username` from a binary file object.
+
+    `file_format` is 'csv' or 'json' (JSON arrays and JSON Lines). After each
+    batch `progress(report)` is called with the running report, a dict of
+    row, insert, duplicate and error counts plus the first
+    `MAX_REPORTED_ERRORS` (row number, message) pairs.
+    """
+    if file_format == 'csv':
+        records = iter_csv_records(stream)
+        columns = resolve_columns(next(records))
+    else:
+        records = iter_json_records(stream)
+        columns, shape = None, None
+    report = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'error_count': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        inserted = insert_readings(username, batch, skip_duplicates=True)
+        report['inserted'] += inserted
+        report['duplicates'] += len(batch) - inserted
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for number, record in records:
+        report['rows'] += 1
+        try:
+            if file_format != 'csv':
+                if isinstance(record, json.JSONDecodeError):
+                    raise ValueError(f"invalid JSON: {record.msg}")
+                if not isinstance(record, dict):
+                    raise ValueError("record is not an object")
+                # JSON exports usually repeat one shape; re-resolve on change
+                if record.keys() != shape:
+                    shape = record.keys()
+                    columns = resolve_columns(shape)
+            batch.append(normalize_record(record, columns))
+        except (ValueError, TypeError) as e:
+            report['error_count'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append((number, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch or progress:
+        flush()
+    return report
@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+from database import connection
+
+class HitCounter:
+    """Hit/miss counters for a cache that is not an LRUCache (e.g. session state)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+class LRUCache:
+    """A thread-safe, size-bounded LRU cache with hit/miss counters."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def discard(self, predicate):
+        """Drop every entry whose key satisfies `predicate`."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+# Per-user data versions. Writers bump a user's version in the transaction
+# that changes their data, which makes every cache entry keyed on the old
+# version unreachable. Versions live in the `data_versions` table, so writes
+# made by any process (the web app, the ingest API) invalidate the caches of
+# all of them; reading one is a primary key lookup.
+DATA_VERSION_QUERY = '''
+    SELECT id, (SELECT version FROM data_versions WHERE user_id = users.id)
+    FROM users WHERE username = ?
+'''
+
+BUMP_DATA_VERSION = '''
+    INSERT INTO data_versions (user_id, version) VALUES (?, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+'''
+
+def get_data_version(username):
+    """An opaque, hashable version of a user's data for use in cache keys.
+
+    It includes the user id, so a username taken over after a rename never
+    matches the previous owner's entries.
+    """
+    with connection() as conn:
+        return conn.execute(DATA_VERSION_QUERY, (username,)).fetchone()
+
+def bump_data_version(conn, user_id):
+    """Bump a user's data version in the caller's transaction."""
+    conn.execute(BUMP_DATA_VERSION, (user_id,))
+
+def discard_user_data(*usernames):
+    """Free this process's cache entries for users whose data or name just changed."""
+    analytics_cache.discard(lambda key: key[0] in usernames)
+
+# Dashboard entries keyed by (username, data version, ...)
+analytics_cache = LRUCache(max_entries=128)
+
+# User records keyed by username (see auth.get_user_info), each tagged with a
+# per-user version so sessions can tell whether their own copy is current.
+# These versions are process-local.
+user_cache = LRUCache(max_entries=1024)
+session_user_hits = HitCounter()
+_user_versions = {}
+_user_versions_lock = threading.Lock()
+
+def get_user_version(username):
+    return _user_versions.get(username, 0)
+
+def invalidate_user(*usernames):
+    """Forget cached user records after the users table changes."""
+    with _user_versions_lock:
+        for username in usernames:
+            _user_versions[username] = _user_versions.get(username, 0) + 1
+    user_cache.discard(lambda key: key in usernames)
+
+# Rendered chart bytes keyed by (kind, format, data hash); see charts.py
+chart_cache = LRUCache(max_entries=256)
+
+# Credentials that passed a bcrypt check, keyed by a keyed digest of the
+# username and password (see auth.authenticate_cached)
+credential_cache = LRUCache(max_entries=4096)
+
+def cache_stats():
+    """Hit-rate metrics of the in-process caches."""
+    return {
+        'analytics': analytics_cache.stats(),
+        'users': user_cache.stats(),
+        'user_sessions': session_user_hits.stats(),
+        'charts': chart_cache.stats(),
+        'credentials': credential_cache.stats(),
+    }
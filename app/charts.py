@@ -0,0 +1,80 @@
+"""Chart rendering for the analytics page.
+
+Figures are built as standalone `matplotlib.figure.Figure` objects drawn by
+the Agg canvas, never through pyplot, so nothing is registered with
+pyplot's global figure manager and a figure is garbage once rendered. The
+rendered bytes are cached in `cache.chart_cache` under a hash of the chart
+kind, the output format and the data plotted, so a rerun, or another window
+or user with identical aggregates, reuses the image instead of
+rasterizing it again.
+"""
+import hashlib
+import io
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from cache import chart_cache
+
+FORMATS = ('png', 'svg')
+
+def new_figure():
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+def render_figure(fig, fmt='png'):
+    """Rasterize (or vectorize) a figure to bytes and release its artists."""
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=fmt, bbox_inches='tight')
+    finally:
+        fig.clear()
+    return buffer.getvalue()
+
+def data_digest(data):
+    """Stable hash of a Series or DataFrame, including its index and labels."""
+    digest = hashlib.sha256()
+    labels = list(data.columns) if isinstance(data, pd.DataFrame) else [data.name]
+    digest.update(repr((type(data).__name__, labels, data.shape)).encode())
+    if len(data):
+        digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    return digest.hexdigest()
+
+def cached_chart(kind, data, draw, fmt='png'):
+    """Bytes of `draw(data)` rendered as `fmt`, from the chart cache when possible."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported chart format {fmt!r}")
+    return chart_cache.get_or_compute(
+        (kind, fmt, data_digest(data)),
+        lambda: render_figure(draw(data), fmt),
+    )
+
+def _draw_pie(counts):
+    fig, ax = new_figure()
+    ax.pie(counts, labels=counts.index, autopct='%1.1f%%', startangle=140)
+    ax.axis('equal')
+    return fig
+
+def _draw_stacked_days(counts):
+    fig, ax = new_figure()
+    if counts.empty:
+        ax.text(0.5, 0.5, "No symptoms logged in this range", ha='center', va='center')
+        ax.axis('off')
+        return fig
+    # Most frequent tags at the bottom of each stack
+    counts = counts[counts.sum().sort_values(ascending=False).index]
+    bottom = None
+    for tag in counts.columns:
+        ax.bar(counts.index, counts[tag], bottom=bottom, width=0.8, label=tag)
+        bottom = counts[tag] if bottom is None else bottom + counts[tag]
+    ax.set_ylabel("Readings")
+    ax.legend()
+    fig.autofmt_xdate()
+    return fig
+
+def pie_chart(counts, fmt='png'):
+    return cached_chart('pie', counts, _draw_pie, fmt)
+
+def symptoms_chart(counts, fmt='png'):
+    """Stacked daily bars of a days × tags count matrix."""
+    return cached_chart('symptoms', counts, _draw_stacked_days, fmt)
@@ -1,47 +1,195 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import metrics
 
-def create_connection():
-    """Create a database connection to the SQLite database."""
-    db_path = os.path.join(os.getcwd(), 'buddybetes.db')
-    conn = sqlite3.connect(db_path)
+# Connection tuning applied once when a pooled connection is opened
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 16 * 1024
+CACHED_STATEMENTS = 256
+POOL_SIZE = int(os.environ.get('BUDDYBETES_DB_POOL_SIZE', '8'))
+# Record per-statement latency and row counts (see metrics.py)
+DB_METRICS = os.environ.get('BUDDYBETES_DB_METRICS', '1') != '0'
+
+# Resolves a username parameter to the integer users.id key
+USER_ID_SUBQUERY = "(SELECT id FROM users WHERE username = ?)"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_db_path():
+    """Return the path of the SQLite database file."""
+    return os.environ.get('BUDDYBETES_DB', os.path.join(os.getcwd(), 'buddybetes.db'))
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that records statement latency and row counts in `metrics`.
+
+    The latency is that of execute(), which for SQLite covers planning and
+    the first step; rows are the rowcount of writes plus rows fetched.
+    """
+
+    _sql = ''
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.record_statement(sql, time.perf_counter() - start, self.rowcount if self.rowcount > 0 else None)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.record_statement(sql, time.perf_counter() - start, self.rowcount if self.rowcount > 0 else None)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            metrics.record_rows(self._sql, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.record_rows(self._sql, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        metrics.record_rows(self._sql, len(rows))
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose statements all run on InstrumentedCursors."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these bypass cursor(), so route them through it
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def create_connection(db_path=None):
+    """Open a new tuned connection to the SQLite database.
+
+    Application code should borrow pooled connections through `connection()`
+    instead of calling this directly.
+    """
+    conn = sqlite3.connect(
+        db_path or get_db_path(),
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False,
+        factory=InstrumentedConnection if DB_METRICS else sqlite3.Connection,
+    )
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA foreign_keys = ON')
     return conn
 
-def create_tables():
-    """Create tables in the SQLite database."""
-    conn = create_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS health_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            glucose_level REAL NOT NULL,
-            bp_systolic INTEGER NOT NULL,
-            bp_diastolic INTEGER NOT NULL,
-            food_intake TEXT,
-            mood TEXT,
-            symptoms TEXT,
-            meal_context TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    print("Tables created successfully.")
-
-def create_user_table():
-    conn = create_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            email TEXT NOT NULL,
-            name TEXT NOT NULL,
-            password TEXT NOT NULL,
-            email_reminder TEXT DEFAULT 'Daily',
-            reminder_time TEXT DEFAULT '07:58'
-        )
-    ''')
-    conn.commit()
-    conn.close()
\ No newline at end of file
+class ConnectionPool:
+    """A bounded pool of long-lived SQLite connections.
+
+    Connections are opened lazily, up to `max_size`, and handed out one
+    borrower at a time. Borrowers block until a connection is returned when
+    the pool is exhausted.
+    """
+
+    def __init__(self, db_path, max_size=POOL_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = create_connection(self.db_path)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a `with` block.
+
+        The block is a unit of work: an open transaction is committed on a
+        clean exit and rolled back if the block raises.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close every connection owned by the pool."""
+        self._closed = True
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    db_path = get_db_path()
+    if _pool is None or _pool.db_path != db_path:
+        with _pool_lock:
+            if _pool is None or _pool.db_path != db_path:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(db_path)
+    return _pool
+
+def connection():
+    """Borrow a pooled connection: `with connection() as conn: ...`."""
+    return get_pool().connection()
+
+def close_pool():
+    """Close the process-wide pool (used by scripts and benchmarks)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,69 @@
+"""Per-user reminder delivery state in the `reminder_deliveries` table.
+
+Each row records when the user's last reminder went out, how the last
+delivery ended ('sent' or 'failed') and how many SMTP attempts it took.
+Mailer batches are recorded in a single transaction, and the dedup check is
+an integer comparison on the primary key row.
+
+`due_recipients` resolves a whole reminder wave with one query per
+reminder slot, checking each user's delivery state by primary key.
+"""
+import time
+from collections import defaultdict
+from database import connection
+
+# Users in one reminder slot not yet sent a reminder since a cutoff. The
+# index is pinned: on small or skewed user tables the planner otherwise
+# prefers a full scan of users. Delivery state is checked with a correlated
+# primary key lookup rather than a join, which the planner may turn into a
+# scan of a small reminder_deliveries table.
+DUE_REMINDERS_QUERY = '''
+    SELECT u.id, u.username, u.email, u.name, u.email_reminder
+    FROM users u INDEXED BY idx_users_reminder_slot
+    WHERE u.email_reminder = ? AND u.reminder_time = ?
+      AND NOT EXISTS (SELECT 1 FROM reminder_deliveries d WHERE d.user_id = u.id AND d.last_sent_at >= ?)
+'''
+
+RECORD_DELIVERY = '''
+    INSERT INTO reminder_deliveries (user_id, last_sent_at, status, attempts) VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        last_sent_at = COALESCE(excluded.last_sent_at, reminder_deliveries.last_sent_at),
+        status = excluded.status,
+        attempts = excluded.attempts
+'''
+
+def minute_start(now=None):
+    """Epoch seconds of the start of the current minute."""
+    now = time.time() if now is None else now
+    return int(now) - int(now) % 60
+
+def due_recipients(due, since):
+    """(user id, username, email, name, email_reminder) rows for the due reminders not yet sent since `since`.
+
+    `due` holds (username, email_reminder, reminder_time) triples. Users
+    whose stored settings no longer match their slot are left out.
+    """
+    slots = defaultdict(set)
+    for username, email_reminder, reminder_time in due:
+        slots[email_reminder, reminder_time].add(username)
+    recipients = []
+    with connection() as conn:
+        for (email_reminder, reminder_time), usernames in slots.items():
+            rows = conn.execute(DUE_REMINDERS_QUERY, (email_reminder, reminder_time, since)).fetchall()
+            recipients.extend(row for row in rows if row[1] in usernames)
+    return recipients
+
+def record_sent(messages, now=None):
+    """Mark the reminders (messages keyed by user id) in a delivered mailer batch as sent."""
+    sent_at = int(time.time() if now is None else now)
+    rows = [(message.key, sent_at, 'sent', message.attempt) for message in messages if message.key is not None]
+    if rows:
+        with connection() as conn:
+            conn.executemany(RECORD_DELIVERY, rows)
+
+def record_failed(message, error=None):
+    """Mark a reminder the mailer gave up on as failed, keeping the last sent time."""
+    if message.key is None:
+        return
+    with connection() as conn:
+        conn.execute(RECORD_DELIVERY, (message.key, None, 'failed', message.attempt))
@@ -0,0 +1,77 @@
+"""Weekly digest emails.
+
+`weekly_stats` computes every recipient's stats for the week in a single
+grouped query: SQLite walks idx_health_data_user_ts once per recipient and
+aggregates in C, so a reminder wave never issues per-user queries.
+`render_digests` turns the stats into email bodies, rendering the template
+once per distinct set of figures.
+"""
+import json
+from datetime import datetime, timedelta
+from string import Template
+from health_data import EPOCH
+from targets import TARGET_HIGH, TARGET_LOW
+
+DIGEST_DAYS = 7
+
+DIGEST_SUBJECT = "[BUDDYBETES] Your weekly health summary"
+
+# One row per recipient with readings in [start_ts, end_ts). A glucose
+# level of 0 is a blank form entry (e.g. a blood-pressure-only reading): it
+# counts as a reading but not towards the glucose figures.
+WEEKLY_STATS_QUERY = f'''
+    SELECT user_id, COUNT(*), AVG(NULLIF(glucose_level, 0)),
+           SUM(glucose_level > 0 AND glucose_level < {TARGET_LOW}), SUM(glucose_level > {TARGET_HIGH})
+    FROM health_data
+    WHERE user_id IN (SELECT value FROM json_each(?)) AND ts >= ? AND ts < ?
+    GROUP BY user_id
+'''
+
+GREETING = "Hi {name},\n\n"
+
+DIGEST_TEMPLATE = Template(
+    "Here is your BuddyBetes summary for the past $days days.\n\n"
+    "- Readings logged: $readings\n"
+    "- Average glucose: $mean\n"
+    "- Readings out of range ($low-$high mg/dL): $out_of_range ($below below, $above above)\n\n"
+    "Keep logging your health data to stay on track!"
+)
+
+EMPTY_TEMPLATE = Template(
+    "You haven't logged any readings in the past $days days. "
+    "This is your BuddyBetes reminder to log your health data."
+)
+
+def week_window(now, tz, days=DIGEST_DAYS):
+    """The [start_ts, end_ts) window of the `days` before `now` in readings' wall-clock encoding."""
+    wall_clock = datetime.fromtimestamp(now, tz).replace(tzinfo=None)
+    end_ts = (wall_clock - EPOCH) // timedelta(seconds=1)
+    return end_ts - days * 86400, end_ts
+
+def weekly_stats(conn, user_ids, start_ts, end_ts):
+    """Map user id to (readings, mean glucose, below, above) for users with readings in the window."""
+    rows = conn.execute(WEEKLY_STATS_QUERY, (json.dumps(list(user_ids)), start_ts, end_ts))
+    return {user_id: stats for user_id, *stats in rows}
+
+def render_digests(recipients, stats, days=DIGEST_DAYS):
+    """Yield (user id, body) for (user id, name) recipients.
+
+    Each distinct set of figures is rendered once; recipients only differ in
+    the greeting.
+    """
+    rendered = {}
+    for user_id, name in recipients:
+        readings, mean, below, above = stats.get(user_id, (0, None, 0, 0))
+        key = (readings, round(mean) if mean is not None else None, below, above)
+        body = rendered.get(key)
+        if body is None:
+            if readings:
+                body = DIGEST_TEMPLATE.substitute(
+                    days=days, readings=readings, mean=f"{key[1]} mg/dL" if mean is not None else "no glucose logged",
+                    low=TARGET_LOW, high=TARGET_HIGH,
+                    out_of_range=below + above, below=below, above=above,
+                )
+            else:
+                body = EMPTY_TEMPLATE.substitute(days=days)
+            rendered[key] = body
+        yield user_id, GREETING.format(name=name) + body
@@ -0,0 +1,39 @@
+import os
+import numpy as np
+
+# Upper bound on the points sent to the browser for one time-series chart
+MAX_CHART_POINTS = int(os.environ.get('BUDDYBETES_MAX_CHART_POINTS', '1000'))
+
+def min_max_indices(values, max_points):
+    """Positions of the min and max sample of each bucket, in order.
+
+    `values` is a 1-D array, or a 2-D array whose columns are downsampled
+    together (the union of every column's extremes is kept). The input is
+    split into equal buckets so the result never exceeds `max_points` rows
+    while keeping every peak and trough.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+
+    # Two samples per column per bucket, plus the first and last sample
+    n_buckets = max((max_points - 2) // (2 * values.shape[1]), 1)
+    buckets = np.arange(n) * n_buckets // n
+    keep = [np.array([0, n - 1])]
+    for column in values.T:
+        # Sort by (bucket, value): the first row of each bucket is its
+        # minimum. NaNs sort last, so the maximum is the last non-NaN row.
+        order = np.lexsort((column, buckets))
+        first = np.searchsorted(buckets[order], np.arange(n_buckets), side='left')
+        present = np.bincount(buckets[~np.isnan(column)], minlength=n_buckets)
+        last = first + np.maximum(present - 1, 0)
+        keep.extend([order[first], order[last]])
+    return np.unique(np.concatenate(keep))
+
+def downsample(frame, max_points=MAX_CHART_POINTS):
+    """Downsample a time-indexed DataFrame or Series for charting."""
+    frame = frame.sort_index()
+    return frame.iloc[min_max_indices(frame.to_numpy(), max_points)]
@@ -1,157 +1,146 @@
 import streamlit as st
 import logging
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from datetime import datetime
+import os
 import pytz
-import schedule
+import threading
 import time
-import yaml
-from database import create_connection
-
-# Constants for email configuration
-EMAIL_ADDRESS = st.secrets["general"]["EMAIL_ADDRESS"]
-EMAIL_PASSWORD = st.secrets["general"]["EMAIL_PASSWORD"]
+from alerts import ALERT_SUBJECT, claim_alerts, format_alert, mark_dispatched, release_alert
+from database import connection
+from deliveries import due_recipients, minute_start, record_failed, record_sent
+from digest import DIGEST_SUBJECT, render_digests, week_window, weekly_stats
+from mailer import Mailer
+from reminder_worker import ReminderWorker, queue_reminder_change
+
+# Constants for email configuration; the account credentials are read from
+# st.secrets["general"] when the mailer is first needed
 SMTP_SERVER = 'smtp.gmail.com'
 SMTP_PORT = 587
+SMTP_WORKERS = int(os.environ.get('BUDDYBETES_SMTP_WORKERS', '4'))
+# Messages per second across all SMTP sessions; 0 disables the limit
+SMTP_RATE = float(os.environ.get('BUDDYBETES_SMTP_RATE', '10'))
 
 # Setting up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Dictionary to store the last sent times
-last_sent_times = {}
-
 # Timezone setup
 PHT = pytz.timezone('Asia/Manila')
 
-# In-memory store for scheduled jobs
-scheduled_jobs = {}
-job_executed = {}
-
-def send_email(username, subject, content):
-    try:
-        conn = create_connection()
-        c = conn.cursor()
-        c.execute('SELECT email FROM users WHERE username = ?', (username,))
-        user_email = c.fetchone()[0]
-        conn.close()
-
-        now = datetime.now(PHT).replace(second=0, microsecond=0)
-        if username in last_sent_times:
-            last_sent_time = datetime.fromisoformat(last_sent_times[username]).replace(second=0, microsecond=0)
-            last_sent_time = PHT.localize(last_sent_time)  # Ensure last sent time is in PHT
-            logger.info("Last sent time for %s: %s", username, last_sent_time)
-            logger.info("Current time: %s", now)
-            if last_sent_time == now:
-                logger.info("Email to %s already sent today.", user_email)
-                return
-
-        logger.info("Attempting to send email to %s with subject: %s", user_email, subject)
-
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = user_email
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(content, 'plain'))
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(EMAIL_ADDRESS, user_email, text)
-        server.quit()
-
-        logger.info("Email sent to %s with subject: %s", user_email, subject)
-
-        last_sent_times[username] = now.isoformat()
-        save_last_sent_times()
-    except Exception as e:
-        logger.error("Failed to send email: %s", e)
-
-
-def schedule_email(username, subject, content):
-    email_reminder, reminder_time = load_reminder_settings(username)
-    job_id = f"{username}_{reminder_time}"
-    if email_reminder != "None":
-        if job_id in scheduled_jobs:
-            logger.info("Removing existing job: %s", job_id)
-            schedule.cancel_job(scheduled_jobs[job_id])
-            del scheduled_jobs[job_id]
-
-        logger.info("Scheduling email for %s at %s", username, reminder_time)
-
-        def job():
-            now = datetime.now(PHT).replace(second=0, microsecond=0)
-            logger.info(f"Executing job for {username} at {now}")
-            logger.info(f"Job ID: {job_id}, Scheduled for: {reminder_time}")
-
-            if job_id in job_executed and job_executed[job_id] == now:
-                logger.info(f"Job already executed for {username} at {reminder_time}")
-                return
-
-            job_executed[job_id] = now
-
-            try:
-                logger.info(f"Calling send_email for {username}")
-                send_email(username, subject, content)
-                logger.info(f"Email sent for job: {job_id}")
-            except Exception as e:
-                logger.error(f"Error in job execution for {job_id}: {e}")
-
-            logger.info(f"Cancelling job after execution: {job_id}")
-            if job_id in scheduled_jobs:
-                schedule.cancel_job(scheduled_jobs[job_id])
-                del scheduled_jobs[job_id]
-
-        job = schedule.every().day.at(reminder_time).do(job)
-        scheduled_jobs[job_id] = job
-        logger.info(f"Job scheduled: {job_id}")
-    else:
-        logger.info(f"No email reminder set for {username}")
-
-def run_scheduler():
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
-        logger.info("Checking for pending jobs...")
-
-        for job in schedule.jobs:
-            logger.info(f"Pending job: {job}")
-
-
-def save_last_sent_times():
-    try:
-        with open('last_sent_times.yaml', 'w') as file:
-            yaml.safe_dump(last_sent_times, file)
-        logger.info("Saved last_sent_times: %s", last_sent_times)
-    except Exception as e:
-        logger.error("Error saving last_sent_times.yaml: %s", e)
-
-def load_last_sent_times():
-    global last_sent_times
-    try:
-        with open('last_sent_times.yaml', 'r') as file:
-            last_sent_times = yaml.safe_load(file)
-        if last_sent_times is None:
-            last_sent_times = {}
-        logger.info("Loaded last_sent_times: %s", last_sent_times)
-    except FileNotFoundError:
-        last_sent_times = {}
-        logger.warning("last_sent_times.yaml file not found. Initializing empty dictionary.")
-    except Exception as e:
-        logger.error("Error loading last_sent_times.yaml: %s", e)
-        last_sent_times = {}
+REMINDER_SUBJECT = "[BUDDYBETES REMINDER] Reminder to log your Health Data!"
+REMINDER_CONTENT = "This is your BuddyBetes reminder to log your health data."
+
+# Set BUDDYBETES_EMBEDDED_REMINDERS=0 on web replicas when a standalone
+# `python app/reminder_worker.py` is deployed. Either way only the holder of
+# the reminders lease sends.
+EMBEDDED_REMINDERS = os.environ.get('BUDDYBETES_EMBEDDED_REMINDERS', '1') != '0'
+
+# Failed deliveries after which an alert is given up on
+ALERT_MAX_FAILURES = 3
+
+worker = None
+_worker_lock = threading.Lock()
+mailer = None
+_mailer_lock = threading.Lock()
+# Mailer keys are user ids for reminders and ('alert', outbox id, attempt)
+# for alerts
+
+def _is_alert(message):
+    return isinstance(message.key, tuple)
+
+def _record_sent(messages):
+    # Called from mailer workers, once per delivered batch
+    record_sent([message for message in messages if not _is_alert(message)])
+    alert_ids = [message.key[1] for message in messages if _is_alert(message)]
+    if alert_ids:
+        with connection() as conn:
+            mark_dispatched(conn, alert_ids)
+    logger.info("Sent %d emails.", len(messages))
+
+def _record_failed(message, error=None):
+    # Called from mailer workers for each message the mailer gave up on
+    if not _is_alert(message):
+        record_failed(message, error)
+        return
+    _, alert_id, attempts = message.key
+    with connection() as conn:
+        if attempts < ALERT_MAX_FAILURES:
+            # Still undispatched in the outbox, so the next heartbeat retries it
+            release_alert(conn, alert_id)
+            return
+        logger.error("Giving up on alert %d to %s after %d failed deliveries: %s", alert_id, message.recipient, attempts, error)
+        mark_dispatched(conn, [alert_id])
+
+def get_mailer():
+    """The process-wide delivery pipeline, created on first use."""
+    global mailer
+    with _mailer_lock:
+        if mailer is None:
+            credentials = st.secrets["general"]
+            mailer = Mailer(
+                SMTP_SERVER, SMTP_PORT, credentials["EMAIL_ADDRESS"], credentials["EMAIL_PASSWORD"],
+                workers=SMTP_WORKERS, rate=SMTP_RATE or None, on_sent=_record_sent, on_failed=_record_failed,
+            )
+        return mailer
+
+def close_mailer(timeout=None):
+    """Deliver queued emails and close SMTP sessions (e.g. on worker shutdown)."""
+    if mailer is not None:
+        mailer.close(timeout)
+
+def send_reminders(due):
+    """Queue one reminder wave: (username, email_reminder, reminder_time) triples.
+
+    Weekly recipients get a digest of their past week instead of the plain
+    reminder.
+    """
+    recipients = due_recipients(due, minute_start())
+    skipped = len(due) - len(recipients)
+    if skipped:
+        logger.info("Skipping %d reminders already sent or no longer due.", skipped)
+    weekly = [(user_id, name) for user_id, _, _, name, email_reminder in recipients if email_reminder == 'Weekly']
+    digests = {}
+    if weekly:
+        with connection() as conn:
+            stats = weekly_stats(conn, [user_id for user_id, _ in weekly], *week_window(time.time(), PHT))
+        digests = dict(render_digests(weekly, stats))
+    mailer = get_mailer()
+    for user_id, username, email, name, email_reminder in recipients:
+        if user_id in digests:
+            mailer.submit(email, DIGEST_SUBJECT, digests[user_id], key=user_id)
+        else:
+            mailer.submit(email, REMINDER_SUBJECT, REMINDER_CONTENT, key=user_id)
+    logger.info("Queued %d reminders (%d weekly digests).", len(recipients), len(digests))
+
+def send_alerts():
+    """Queue emails for out-of-range alerts waiting in the outbox.
+
+    Alerts are claimed in the outbox before they are queued, so overlapping
+    heartbeats and a newly elected leader skip them. They stay undispatched
+    until the mailer reports them delivered: a failed delivery releases the
+    claim, and a crash leaves it to expire, for a later heartbeat to retry.
+    """
+    with connection() as conn:
+        alerts = claim_alerts(conn)
+    if not alerts:
+        return
+    mailer = get_mailer()
+    for alert_id, attempts, email, name, kind, glucose, bp_systolic, bp_diastolic, change in alerts:
+        content = f"Hi {name},\n\n{format_alert(kind, glucose, bp_systolic, bp_diastolic, change)}"
+        mailer.submit(email, ALERT_SUBJECT, content, key=('alert', alert_id, attempts))
+    logger.info("Queued %d alert emails.", len(alerts))
+
+def reschedule_reminder(username, old_username=None):
+    """Queue a user's saved reminder settings (and a rename) for the reminder leader."""
+    queue_reminder_change(username, old_username)
+
+def load_all_reminder_settings():
+    with connection() as conn:
+        return conn.execute("SELECT username, email_reminder, reminder_time FROM users WHERE email_reminder IN ('Daily', 'Weekly')").fetchall()
 
 def load_reminder_settings(username):
     try:
-        conn = create_connection()
-        c = conn.cursor()
-        c.execute('SELECT email_reminder, reminder_time FROM users WHERE username = ?', (username,))
-        user_settings = c.fetchone()
-        conn.close()
+        with connection() as conn:
+            user_settings = conn.execute('SELECT email_reminder, reminder_time FROM users WHERE username = ?', (username,)).fetchone()
 
         if user_settings:
             email_reminder, reminder_time = user_settings
@@ -162,18 +151,13 @@ def load_reminder_settings(username):
         logger.error("Error loading reminder settings for %s: %s", username, e)
         return 'None', '12:00'
 
-def run_scheduler():
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
-
 # This function should be called to start the scheduler in your Streamlit app
 def start_scheduler_thread():
-    logger.info("Starting scheduler thread...")
-    import threading
-    scheduler_thread = threading.Thread(target=run_scheduler)
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
-    logger.info("Scheduler thread started.")
-
-start_scheduler_thread()
+    """Run the embedded reminder worker once per process, if enabled."""
+    global worker
+    with _worker_lock:
+        if worker is not None or not EMBEDDED_REMINDERS:
+            return
+        logger.info("Starting embedded reminder worker...")
+        worker = ReminderWorker(send_reminders, load_reminder_settings, load_all_reminder_settings, PHT, dispatch_alerts=send_alerts)
+        threading.Thread(target=worker.run, name="reminder-worker", daemon=True).start()
@@ -0,0 +1,116 @@
+"""Streaming export of a user's health data to CSV and Parquet.
+
+Readings are read in fixed-size keyset chunks and written out as they
+arrive, so peak memory depends on the chunk size, not on history length.
+"""
+import csv
+import io
+import os
+from database import USER_ID_SUBQUERY, connection
+from health_data import READING_COLUMNS, from_timestamp
+
+CHUNK_SIZE = 5000
+
+# Largest export offered for download. Streamlit holds a download's bytes in
+# server memory until the session moves on, so exports are capped.
+MAX_EXPORT_MB = int(os.environ.get('BUDDYBETES_MAX_EXPORT_MB', '100'))
+
+# Exportable columns; `datetime` is decoded from ts
+EXPORT_COLUMNS = ('datetime',) + READING_COLUMNS[1:]
+
+def iter_reading_chunks(username, start_ts=None, end_ts=None, columns=EXPORT_COLUMNS, chunk_size=CHUNK_SIZE):
+    """Yield lists of reading tuples, oldest first, ordered like `columns`.
+
+    Each chunk is a separate keyset query on (ts, id), so no connection or
+    read transaction is held while the caller writes a chunk out.
+    """
+    select = ', '.join('ts' if column == 'datetime' else column for column in columns)
+    clauses = [f"user_id = {USER_ID_SUBQUERY}"]
+    params = [username]
+    if start_ts is not None:
+        clauses.append("ts >= ?")
+        params.append(start_ts)
+    if end_ts is not None:
+        clauses.append("ts < ?")
+        params.append(end_ts)
+    where = ' AND '.join(clauses)
+    cursor = None
+    while True:
+        keyset = " AND (ts, id) > (?, ?)" if cursor else ""
+        sql = f"SELECT ts, id, {select} FROM health_data WHERE {where}{keyset} ORDER BY ts, id LIMIT ?"
+        with connection() as conn:
+            rows = conn.execute(sql, params + list(cursor or ()) + [chunk_size]).fetchall()
+        if not rows:
+            return
+        cursor = rows[-1][:2]
+        yield [row[2:] for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+def _format_datetimes(chunk, columns):
+    if 'datetime' not in columns:
+        return chunk
+    position = columns.index('datetime')
+    return [
+        row[:position] + (from_timestamp(row[position]).isoformat(sep=' '),) + row[position + 1:]
+        for row in chunk
+    ]
+
+def write_csv(chunks, fileobj, columns=EXPORT_COLUMNS):
+    """Write chunks as CSV to a binary file object; returns the row count."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    rows = 0
+    for chunk in chunks:
+        writer.writerows(_format_datetimes(chunk, list(columns)))
+        rows += len(chunk)
+    text.flush()
+    text.detach()
+    return rows
+
+def write_parquet(chunks, fileobj, columns=EXPORT_COLUMNS):
+    """Write chunks as Parquet, one row group per chunk; returns the row count.
+
+    Requires the optional `pyarrow` package.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires the pyarrow package (pip install pyarrow).")
+
+    types = {
+        'datetime': pa.timestamp('s'),
+        'glucose_level': pa.float64(),
+        'bp_systolic': pa.int64(),
+        'bp_diastolic': pa.int64(),
+    }
+    schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+    rows = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for chunk in chunks:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(chunk)
+    return rows
+
+def _capped(chunks, fileobj, max_bytes):
+    """Pass chunks through, raising ValueError once `fileobj` grows past `max_bytes`."""
+    for chunk in chunks:
+        if fileobj.tell() > max_bytes:
+            raise ValueError(f"the export is larger than {max_bytes // (1024 * 1024)} MB")
+        yield chunk
+
+def export_readings(username, fileobj, file_format, start_ts=None, end_ts=None, columns=EXPORT_COLUMNS, max_bytes=None):
+    """Stream a user's readings into `fileobj` as 'csv' or 'parquet'.
+
+    With `max_bytes`, writing stops with ValueError once the file passes it.
+    """
+    columns = tuple(columns)
+    chunks = iter_reading_chunks(username, start_ts, end_ts, columns)
+    if max_bytes is not None:
+        chunks = _capped(chunks, fileobj, max_bytes)
+    if file_format == 'parquet':
+        return write_parquet(chunks, fileobj, columns)
+    return write_csv(chunks, fileobj, columns)
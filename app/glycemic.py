@@ -0,0 +1,172 @@
+"""Vectorized glycemic variability metrics for CGM and SMBG readings.
+
+Every function takes glucose values in mg/dL (and, where time matters, a
+DatetimeIndex) and runs in NumPy/pandas without Python-level loops over
+readings. The one exception is MAGE's peak/nadir elimination, which loops
+over turning points after NumPy has found them.
+"""
+import numpy as np
+import pandas as pd
+from targets import TARGET_HIGH, TARGET_LOW, VERY_HIGH, VERY_LOW
+
+AGP_PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+AGP_SLOT_MINUTES = 30
+
+def range_fractions(glucose):
+    """Fractions of readings below, within and above the target range."""
+    glucose = np.asarray(glucose, dtype=float)
+    glucose = glucose[~np.isnan(glucose)]
+    n = len(glucose)
+    if n == 0:
+        return {'very_low': np.nan, 'below': np.nan, 'in_range': np.nan, 'above': np.nan, 'very_high': np.nan}
+    return {
+        'very_low': np.count_nonzero(glucose < VERY_LOW) / n,
+        'below': np.count_nonzero(glucose < TARGET_LOW) / n,
+        'in_range': np.count_nonzero((glucose >= TARGET_LOW) & (glucose <= TARGET_HIGH)) / n,
+        'above': np.count_nonzero(glucose > TARGET_HIGH) / n,
+        'very_high': np.count_nonzero(glucose > VERY_HIGH) / n,
+    }
+
+def glucose_management_indicator(mean_glucose):
+    """GMI (%) from mean glucose in mg/dL (Bergenstal et al., 2018)."""
+    return 3.31 + 0.02392 * mean_glucose
+
+def coefficient_of_variation(glucose):
+    """Glucose CV in percent (SD / mean)."""
+    glucose = np.asarray(glucose, dtype=float)
+    mean = np.nanmean(glucose)
+    return np.nanstd(glucose, ddof=1) / mean * 100 if mean else np.nan
+
+def _excursion_pivots(extrema, threshold):
+    """Peaks and nadirs left after eliminating swings smaller than `threshold`.
+
+    A zigzag pass over alternating turning points: a pivot is confirmed only
+    once glucose has reversed from it by more than `threshold`, so a noisy
+    excursion keeps its true peak and nadir instead of splitting into small
+    swings.
+    """
+    pivots = []
+    high = low = candidate = extrema[0]
+    direction = 0
+    for value in extrema:
+        if direction == 0:
+            high, low = max(high, value), min(low, value)
+            if high - low > threshold:
+                direction = 1 if value == high else -1
+                pivots.append(low if direction == 1 else high)
+                candidate = value
+        elif (value - candidate) * direction > 0:
+            candidate = value
+        elif abs(value - candidate) > threshold:
+            pivots.append(candidate)
+            direction, candidate = -direction, value
+    if direction != 0:
+        pivots.append(candidate)
+    return np.asarray(pivots)
+
+def mage(glucose):
+    """Mean amplitude of glycemic excursions.
+
+    Turning points are found from sign changes of the first difference
+    (plateaus are skipped). Peak/nadir pairs that differ by less than one
+    standard deviation are then eliminated, and MAGE is the mean amplitude
+    of the remaining swings. Only the elimination loops in Python, over
+    turning points rather than readings.
+    """
+    glucose = np.asarray(glucose, dtype=float)
+    glucose = glucose[~np.isnan(glucose)]
+    if len(glucose) < 3:
+        return np.nan
+    sd = np.std(glucose, ddof=1)
+    diffs = np.diff(glucose)
+    moving = np.flatnonzero(diffs)
+    if len(moving) < 2:
+        return np.nan
+    direction = np.sign(diffs[moving])
+    # A turning point sits where the direction of travel flips
+    flips = moving[1:][direction[1:] != direction[:-1]]
+    extrema = glucose[np.concatenate(([0], flips, [len(glucose) - 1]))]
+    swings = np.abs(np.diff(_excursion_pivots(extrema.tolist(), sd)))
+    return swings.mean() if len(swings) else np.nan
+
+def daily_stats(series):
+    """Per-day count, mean and SD of a datetime-indexed glucose series."""
+    days = series.index.normalize()
+    return series.groupby(days).agg(['count', 'mean', 'std'])
+
+def ambulatory_glucose_profile(series, slot_minutes=AGP_SLOT_MINUTES, percentiles=AGP_PERCENTILES):
+    """Glucose percentiles by time of day, one row per `slot_minutes` slot."""
+    index = series.index
+    slot = (index.hour * 60 + index.minute) // slot_minutes * slot_minutes
+    profile = series.groupby(slot).quantile(list(percentiles)).unstack()
+    profile.index = pd.to_datetime(profile.index, unit='m').strftime('%H:%M')
+    profile.index.name = 'time_of_day'
+    profile.columns = [f'p{round(q * 100)}' for q in profile.columns]
+    return profile
+
+def glycemic_summary(series):
+    """Compute every metric for a datetime-indexed glucose series in one pass.
+
+    Zero glucose values are blank form entries, not readings, and are dropped.
+    """
+    series = series.dropna().sort_index()
+    series = series[series > 0]
+    values = series.to_numpy(dtype=float)
+    mean = values.mean() if len(values) else np.nan
+    return {
+        'readings': len(values),
+        'mean': mean,
+        'sd': values.std(ddof=1) if len(values) > 1 else np.nan,
+        'gmi': glucose_management_indicator(mean),
+        'cv': coefficient_of_variation(values) if len(values) > 1 else np.nan,
+        'mage': mage(values),
+        'ranges': range_fractions(values),
+        'daily': daily_stats(series),
+        'agp': ambulatory_glucose_profile(series),
+    }
+
+def _sd_from_sums(count, total, sumsq):
+    """Sample SD from count, sum and sum of squares (NaN below two values)."""
+    count = np.asarray(count, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = (sumsq - total * total / count) / (count - 1)
+    return np.where(count > 1, np.sqrt(np.clip(variance, 0, None)), np.nan)
+
+def rollup_summary(daily):
+    """The window metrics computable from per-day rollups.
+
+    `daily` is indexed by day with the columns of
+    `rollups.DAILY_GLUCOSE_QUERY`: count, sum, sumsq and the per-range
+    counts. Everything here costs O(days) whatever the reading density;
+    MAGE and the AGP need raw readings and are left out.
+    """
+    count = daily['count'].sum()
+    if count == 0:
+        nan = np.nan
+        return {
+            'readings': 0, 'mean': nan, 'sd': nan, 'gmi': nan, 'cv': nan,
+            'ranges': range_fractions([]),
+            'daily': pd.DataFrame(columns=['count', 'mean', 'std']),
+        }
+    mean = daily['sum'].sum() / count
+    sd = float(_sd_from_sums(count, daily['sum'].sum(), daily['sumsq'].sum()))
+    below, above = daily['below'].sum(), daily['above'].sum()
+    return {
+        'readings': int(count),
+        'mean': mean,
+        'sd': sd,
+        'gmi': glucose_management_indicator(mean),
+        'cv': sd / mean * 100 if mean else np.nan,
+        'ranges': {
+            'very_low': daily['very_low'].sum() / count,
+            'below': below / count,
+            'in_range': (count - below - above) / count,
+            'above': above / count,
+            'very_high': daily['very_high'].sum() / count,
+        },
+        'daily': pd.DataFrame({
+            'count': daily['count'],
+            'mean': daily['sum'] / daily['count'],
+            'std': _sd_from_sums(daily['count'], daily['sum'], daily['sumsq']),
+        }, index=daily.index),
+    }
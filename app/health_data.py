@@ -0,0 +1,175 @@
+import calendar
+from datetime import datetime, timedelta
+from database import USER_ID_SUBQUERY, connection
+from cache import bump_data_version, discard_user_data
+from writer import GroupCommitWriter
+import alerts
+import rollups
+import symptom_tags
+
+# Readings store their wall-clock date and time as integer seconds since the
+# epoch (`ts`), encoded without a timezone shift so that
+# `pd.to_datetime(ts, unit='s')` gives back exactly what the user entered.
+READING_COLUMNS = ('ts', 'glucose_level', 'bp_systolic', 'bp_diastolic', 'food_intake', 'mood', 'symptoms', 'meal_context')
+
+EPOCH = datetime(1970, 1, 1)
+
+MOODS = ["Happy", "Sad", "Neutral", "Anxious", "Stressed"]
+MEAL_CONTEXTS = ["Before Breakfast", "After Breakfast", "Before Lunch", "After Lunch", "Before Dinner", "After Dinner", "Other"]
+
+LOG_PAGE_SIZE = 50
+LOG_COLUMNS = ('id',) + READING_COLUMNS
+
+# Readings in a half-open [start_ts, end_ts) window, newest first
+DASHBOARD_QUERY = (
+    "SELECT ts, glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context "
+    f"FROM health_data WHERE user_id = {USER_ID_SUBQUERY} AND ts >= ? AND ts < ? ORDER BY ts DESC"
+)
+
+# The latest reading in a [start, end) window
+LAST_READING_QUERY = DASHBOARD_QUERY + " LIMIT 1"
+
+HISTORY_BOUNDS_QUERY = f"SELECT MIN(ts), MAX(ts) FROM health_data WHERE user_id = {USER_ID_SUBQUERY}"
+
+INSERT_READING = (
+    f"INSERT INTO health_data (user_id, {', '.join(READING_COLUMNS)}) "
+    f"VALUES (?, {', '.join('?' for _ in READING_COLUMNS)})"
+)
+
+def to_timestamp(date, time):
+    """Encode a wall-clock date and time as epoch seconds."""
+    return calendar.timegm(datetime.combine(date, time).timetuple())
+
+def from_timestamp(ts):
+    """Decode epoch seconds back into a naive wall-clock datetime."""
+    return EPOCH + timedelta(seconds=ts)
+
+def day_range_to_timestamps(start_date, end_date):
+    """Convert an inclusive date range into a half-open [start_ts, end_ts) window."""
+    midnight = datetime.min.time()
+    return to_timestamp(start_date, midnight), to_timestamp(end_date + timedelta(days=1), midnight)
+
+def get_history_bounds(username):
+    """Return the first and last reading datetimes for a user, or (None, None)."""
+    with connection() as conn:
+        first_ts, last_ts = conn.execute(HISTORY_BOUNDS_QUERY, (username,)).fetchone()
+    if first_ts is None:
+        return None, None
+    return from_timestamp(first_ts), from_timestamp(last_ts)
+
+def _log_filters(username, start_ts, end_ts, mood=None, meal_context=None, search=None):
+    clauses = [f"user_id = {USER_ID_SUBQUERY}", "ts >= ?", "ts < ?"]
+    params = [username, start_ts, end_ts]
+    if mood:
+        clauses.append("mood = ?")
+        params.append(mood)
+    if meal_context:
+        clauses.append("meal_context = ?")
+        params.append(meal_context)
+    if search:
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append("(food_intake LIKE ? ESCAPE '\\' OR symptoms LIKE ? ESCAPE '\\')")
+        params.extend([pattern, pattern])
+    return ' AND '.join(clauses), params
+
+def count_logs(username, start_ts, end_ts, **filters):
+    """Count the readings matching the log browser filters."""
+    where, params = _log_filters(username, start_ts, end_ts, **filters)
+    with connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM health_data WHERE {where}", params).fetchone()[0]
+
+def log_page_query(username, start_ts, end_ts, after=None, page_size=LOG_PAGE_SIZE, **filters):
+    """Build the SQL and parameters for one page of the log browser."""
+    where, params = _log_filters(username, start_ts, end_ts, **filters)
+    if after is not None:
+        where += " AND (ts, id) < (?, ?)"
+        params.extend(after)
+    sql = f"SELECT {', '.join(LOG_COLUMNS)} FROM health_data WHERE {where} ORDER BY ts DESC, id DESC LIMIT ?"
+    return sql, params + [page_size + 1]
+
+def fetch_log_page(username, start_ts, end_ts, after=None, page_size=LOG_PAGE_SIZE, **filters):
+    """Fetch one page of readings, newest first, using keyset pagination.
+
+    `after` is the (ts, id) of the last row of the previous page. Returns
+    the page rows (ordered like `LOG_COLUMNS`) and the cursor of the next
+    page, or None when this is the last page.
+    """
+    sql, params = log_page_query(username, start_ts, end_ts, after, page_size, **filters)
+    with connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    next_cursor = (rows[page_size - 1][1], rows[page_size - 1][0]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+def get_user_id(conn, username):
+    row = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    if row is None:
+        raise LookupError(f"Unknown user: {username}")
+    return row[0]
+
+def _drop_duplicates(conn, user_id, readings):
+    """Drop readings already stored, or repeated in the batch, by (ts, glucose)."""
+    if not readings:
+        return readings
+    timestamps = [reading[0] for reading in readings]
+    seen = set(conn.execute(
+        'SELECT ts, glucose_level FROM health_data WHERE user_id = ? AND ts >= ? AND ts <= ?',
+        (user_id, min(timestamps), max(timestamps)),
+    ))
+    unique = []
+    for reading in readings:
+        key = (reading[0], reading[1])
+        if key not in seen:
+            seen.add(key)
+            unique.append(reading)
+    return unique
+
+def write_readings(conn, username, readings, skip_duplicates=False):
+    """Insert readings inside the caller's transaction; returns (count, alerts).
+
+    Each reading is a tuple ordered like `READING_COLUMNS`. With
+    `skip_duplicates`, readings whose (ts, glucose_level) is already stored
+    for the user are left out. Out-of-range alerts are queued alongside and
+    the user's data version is bumped. The caller must hold the write lock,
+    so the rows above `after_id` are exactly the ones inserted here.
+    """
+    user_id = get_user_id(conn, username)
+    readings = _drop_duplicates(conn, user_id, list(readings)) if skip_duplicates else list(readings)
+    after_id = rollups.last_reading_id(conn)
+    inserted = conn.executemany(INSERT_READING, ((user_id, *reading) for reading in readings)).rowcount
+    rollups.apply_since(conn, after_id, user_id)
+    symptom_tags.apply_since(conn, after_id, user_id)
+    if inserted:
+        bump_data_version(conn, user_id)
+    return inserted, alerts.process_readings(conn, user_id, readings)
+
+# All health_data inserts go through one writer thread that group-commits
+# whatever arrives within a couple of milliseconds, instead of every session
+# contending for SQLite's write lock on its own
+health_writer = GroupCommitWriter(
+    write_readings,
+    after_commit=lambda args, result: discard_user_data(args[0]),
+    name='health-data-writer',
+)
+
+def insert_readings(username, readings, skip_duplicates=False, raised_alerts=None):
+    """Insert readings for a user in one transaction and return the count.
+
+    Blocks until the writer has committed them. Out-of-range alerts raised
+    by the readings are appended to `raised_alerts` if it is a list. Raises
+    `writer.WriterBusy` when the write queue is full or the commit does not
+    finish within `writer.COMMIT_TIMEOUT`.
+    """
+    inserted, queued = health_writer.call(username, list(readings), skip_duplicates)
+    if raised_alerts is not None:
+        raised_alerts.extend(queued)
+    return inserted
+
+def insert_reading(username, date, time, glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context):
+    """Insert a single reading entered through the log form; returns the alerts it raised."""
+    raised_alerts = []
+    insert_readings(
+        username,
+        [(to_timestamp(date, time), glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context)],
+        raised_alerts=raised_alerts,
+    )
+    return raised_alerts
@@ -0,0 +1,152 @@
+"""HTTP ingestion endpoint for meters and phone apps.
+
+Run it next to the web app:
+
+    python app/ingest_api.py [--host 127.0.0.1] [--port 8502]
+
+Devices POST readings to `/v1/readings` with HTTP Basic credentials of a
+BuddyBetes account. The body is a JSON array (or JSON Lines) of records in
+any shape the bulk importer accepts, e.g.
+
+    [{"timestamp": "2024-06-20T08:00:00", "glucose": 112, "meal_context": "Before Breakfast"}]
+
+Records are validated and stored exactly as an uploaded JSON export would
+be (`bulk_import.import_readings`), so readings a device resends are
+skipped as duplicates. Each insert bumps the user's data version in
+SQLite, so the web app's dashboards show the readings on their next
+render. The response is the import report. Credentials are
+checked with `auth.authenticate_cached`, so only a device's first request
+pays for bcrypt. `GET /healthz` reports the health_data writer's stats and
+`GET /metrics` this process's metrics in the Prometheus text format.
+"""
+import argparse
+import base64
+import binascii
+import io
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from auth import authenticate_cached
+from bulk_import import import_readings
+from health_data import health_writer
+from metrics import render_prometheus
+from passwords import LoginThrottled, PasswordServiceBusy, password_service
+from writer import WriterBusy
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get('BUDDYBETES_INGEST_HOST', '127.0.0.1')
+PORT = int(os.environ.get('BUDDYBETES_INGEST_PORT', '8502'))
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+def parse_basic_auth(header):
+    """(username, password) from an Authorization header, or None."""
+    scheme, _, credentials = (header or '').partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    try:
+        username, sep, password = base64.b64decode(credentials, validate=True).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return (username, password) if sep and username else None
+
+class IngestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a device posting batches reuses its connection
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BuddyBetesIngest/1.0'
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message, headers=()):
+        self._send_json(status, {'error': message}, headers)
+
+    def do_GET(self):
+        if self.path == '/healthz':
+            self._send_json(200, {'status': 'ok', 'writer': health_writer.stats()})
+        elif self.path == '/metrics':
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._error(404, "not found")
+
+    def do_POST(self):
+        if self.path != '/v1/readings':
+            self.close_connection = True
+            return self._error(404, "not found")
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            return self._error(411, "Content-Length required")
+        if int(length) > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._error(413, f"body larger than {MAX_BODY_BYTES} bytes")
+        # Read the body even if the request is rejected below, so the
+        # connection stays usable for the next one
+        body = self.rfile.read(int(length))
+
+        credentials = parse_basic_auth(self.headers.get('Authorization'))
+        try:
+            if credentials is None or not authenticate_cached(*credentials, client_ip=self.client_address[0]):
+                return self._error(401, "invalid credentials", [('WWW-Authenticate', 'Basic realm="BuddyBetes"')])
+            report = import_readings(credentials[0], io.BytesIO(body), 'json')
+        except LoginThrottled as e:
+            return self._error(429, str(e), [('Retry-After', str(int(e.retry_after) + 1))])
+        except (PasswordServiceBusy, WriterBusy) as e:
+            return self._error(503, str(e), [('Retry-After', '1')])
+        except Exception as e:
+            logger.exception("ingest for %s failed", credentials[0])
+            return self._error(500, str(e))
+        self._send_json(200, report)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+def make_server(host=HOST, port=PORT):
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from migrations import init_db
+
+    init_db()
+    server = make_server(args.host, args.port)
+    # shutdown() blocks until serve_forever returns, so it can't run on the main thread
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("ingest API listening on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        health_writer.stop()
+        password_service.shutdown()
+
+if __name__ == "__main__":
+    main()
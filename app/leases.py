@@ -0,0 +1,57 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from database import connection
+
+logger = logging.getLogger(__name__)
+
+def default_holder():
+    """A holder id unique to this process: host, pid and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class Lease:
+    """A named, time-limited leadership lease stored in the `leases` table.
+
+    At most one holder owns a lease at a time. The owner renews it by calling
+    `acquire()` again before `ttl` seconds pass; once it lapses any other
+    process may take it over.
+    """
+
+    def __init__(self, name, holder=None, ttl=30.0, clock=time.time):
+        self.name = name
+        self.holder = holder or default_holder()
+        self.ttl = ttl
+        self.clock = clock
+        self.expires_at = 0.0
+
+    def acquire(self):
+        """Take or renew the lease; returns True while this holder owns it."""
+        now = self.clock()
+        with connection() as conn:
+            changed = conn.execute('''
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            ''', (self.name, self.holder, now + self.ttl, now)).rowcount
+        if changed:
+            if not self.held(now):
+                logger.info("Acquired lease %s as %s", self.name, self.holder)
+            self.expires_at = now + self.ttl
+        else:
+            if self.held(now):
+                logger.warning("Lost lease %s", self.name)
+            self.expires_at = 0.0
+        return bool(changed)
+
+    def held(self, now=None):
+        """True while the last successful acquire has not expired."""
+        return (self.clock() if now is None else now) < self.expires_at
+
+    def release(self):
+        with connection() as conn:
+            conn.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (self.name, self.holder))
+        if self.held():
+            logger.info("Released lease %s", self.name)
+        self.expires_at = 0.0
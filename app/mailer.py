@@ -0,0 +1,245 @@
+"""Pooled, batched SMTP delivery.
+
+Messages are queued and sent by a small pool of worker threads. Each worker
+keeps one authenticated SMTP session open and sends up to `batch_size`
+queued messages over it before checking the queue again, so a burst of
+reminders costs one TLS handshake and login per worker instead of one per
+email. Idle sessions are closed after `idle_timeout` seconds.
+
+Transient failures (dropped connections, 4xx replies) are retried with
+exponential backoff; permanent 5xx failures are reported once. A shared
+token bucket caps the send rate across all workers.
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import namedtuple
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+BATCH_SIZE = 50
+IDLE_TIMEOUT = 30.0
+MAX_ATTEMPTS = 4
+BACKOFF_SECONDS = 2.0
+
+# `key` identifies the message to the on_sent/on_failed callbacks (e.g. a username)
+Message = namedtuple('Message', 'recipient subject content key attempt')
+
+class TokenBucket:
+    """Allow `rate` events per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def _is_transient(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # Disconnects, timeouts and socket errors
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+class Mailer:
+    """Queue emails and deliver them over reused SMTP sessions.
+
+    `on_sent(messages)` is called once per delivered batch and
+    `on_failed(message, error)` once per message that gave up; both run on
+    worker threads.
+    """
+
+    def __init__(self, host, port, sender, password=None, starttls=True, workers=WORKERS,
+                 batch_size=BATCH_SIZE, rate=None, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF_SECONDS,
+                 idle_timeout=IDLE_TIMEOUT, on_sent=None, on_failed=None, smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.starttls = starttls
+        self.workers = workers
+        self.batch_size = batch_size
+        self.limiter = TokenBucket(rate) if rate else None
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.smtp_factory = smtp_factory
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._stopping = False
+        self.counters = {'sent': 0, 'failed': 0, 'retried': 0, 'sessions': 0}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"mailer-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, recipient, subject, content, key=None):
+        """Queue one plain-text email; returns immediately."""
+        self.start()
+        with self._lock:
+            self._pending += 1
+        self._queue.put(Message(recipient, subject, content, key, 1))
+
+    def join(self, timeout=None):
+        """Wait until every queued message (and retry) is sent or has failed."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=None):
+        """Deliver what is queued, then stop the workers and quit their sessions."""
+        self.join(timeout)
+        with self._lock:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, queued=self._pending)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _done(self, amount):
+        with self._idle:
+            self._pending -= amount
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _connect(self):
+        with metrics.smtp_seconds.time(operation='connect'):
+            session = self.smtp_factory(self.host, self.port)
+            if self.starttls:
+                session.starttls()
+            if self.password:
+                session.login(self.sender, self.password)
+        self._count('sessions')
+        return session
+
+    @staticmethod
+    def _quit(session):
+        try:
+            session.quit()
+        except (smtplib.SMTPException, OSError):
+            session.close()
+
+    def _format(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = message.recipient
+        msg['Subject'] = message.subject
+        msg.attach(MIMEText(message.content, 'plain'))
+        return msg.as_string()
+
+    def _next_batch(self):
+        """Block for one message, then take up to batch_size - 1 more without waiting."""
+        try:
+            first = self._queue.get(timeout=self.idle_timeout)
+        except queue.Empty:
+            return None
+        batch = [first]
+        while first is not None and len(batch) < self.batch_size:
+            try:
+                message = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                # Leave each worker exactly one stop sentinel
+                self._queue.put(None)
+                break
+            batch.append(message)
+        return batch
+
+    def _work(self):
+        session = None
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                # Idle: don't hold the server's connection slot
+                if session is not None:
+                    self._quit(session)
+                    session = None
+                continue
+            if batch[0] is None:
+                if session is not None:
+                    self._quit(session)
+                return
+            sent = []
+            for message in batch:
+                if self.limiter:
+                    self.limiter.acquire()
+                try:
+                    if session is None:
+                        session = self._connect()
+                    with metrics.smtp_seconds.time(operation='send'):
+                        session.sendmail(self.sender, message.recipient, self._format(message))
+                    sent.append(message)
+                except Exception as e:
+                    if session is not None and not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                        # The session may be unusable; reconnect for the next message
+                        session.close()
+                        session = None
+                    self._failed(message, e)
+            if sent:
+                self._count('sent', len(sent))
+                if self.on_sent:
+                    try:
+                        self.on_sent(sent)
+                    except Exception as e:
+                        logger.error("on_sent callback failed: %s", e)
+                self._done(len(sent))
+
+    def _failed(self, message, error):
+        if _is_transient(error) and message.attempt < self.max_attempts and not self._stopping:
+            delay = self.backoff * 2 ** (message.attempt - 1)
+            logger.warning("Email to %s failed (%s); retry %d in %.1fs", message.recipient, error, message.attempt, delay)
+            self._count('retried')
+            timer = threading.Timer(delay, self._queue.put, (message._replace(attempt=message.attempt + 1),))
+            timer.daemon = True
+            timer.start()
+            return
+        logger.error("Giving up on email to %s after %d attempts: %s", message.recipient, message.attempt, error)
+        self._count('failed')
+        if self.on_failed:
+            try:
+                self.on_failed(message, error)
+            except Exception as e:
+                logger.error("on_failed callback failed: %s", e)
+        self._done(1)
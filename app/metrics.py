@@ -0,0 +1,187 @@
+"""In-process performance metrics.
+
+Timings are recorded into histograms with fixed Prometheus buckets, plus a
+bounded reservoir of recent samples per label set for the p50/p95/p99 shown
+on the diagnostics page. `render_prometheus()` produces the text exposition
+format; the ingest API serves it at `/metrics` and the standalone reminder
+worker writes it to `BUDDYBETES_METRICS_FILE` (for a node_exporter textfile
+collector) on every heartbeat.
+
+Metrics are per process, like the caches in cache.py.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Recent samples kept per label set for percentiles
+RESERVOIR_SIZE = 1024
+
+SLOW_QUERY_SECONDS = float(os.environ.get('BUDDYBETES_SLOW_QUERY_MS', '100')) / 1000
+SLOW_QUERY_SAMPLES = 50
+METRICS_FILE = os.environ.get('BUDDYBETES_METRICS_FILE')
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    """A monotonically increasing total per label set."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def exposition(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in sorted(self.values().items())]
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set, plus recent samples."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0,
+                                              'recent': deque(maxlen=RESERVOIR_SIZE)}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+            series['recent'].append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a `with` block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self):
+        """{labels: {'count', 'mean', 'p50', 'p95', 'p99', 'max'}}, percentiles over recent samples."""
+        with self._lock:
+            snapshot = {key: (series['count'], series['sum'], sorted(series['recent'])) for key, series in self._series.items()}
+        result = {}
+        for key, (count, total, recent) in snapshot.items():
+            def percentile(fraction):
+                return recent[min(len(recent) - 1, int(len(recent) * fraction))]
+            result[key] = {
+                'count': count,
+                'mean': total / count,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': recent[-1],
+            }
+        return result
+
+    def exposition(self):
+        with self._lock:
+            snapshot = sorted((key, list(series['buckets']), series['sum'], series['count']) for key, series in self._series.items())
+        lines = []
+        for key, buckets, total, count in snapshot:
+            cumulative = 0
+            for bound, observed in zip(self.buckets, buckets):
+                cumulative += observed
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", repr(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+def render_prometheus():
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.exposition())
+    return '\n'.join(lines) + '\n'
+
+def write_textfile(path=METRICS_FILE):
+    """Atomically replace `path` with the current exposition, if a path is set."""
+    if not path:
+        return
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as file:
+        file.write(render_prometheus())
+    os.replace(temporary, path)
+
+_WHITESPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """A compact, bounded label for a SQL statement."""
+    return _WHITESPACE.sub(' ', sql).strip()[:120]
+
+page_seconds = Histogram('buddybetes_page_seconds', 'Time to render a page of the Streamlit app.', ['page'])
+db_statement_seconds = Histogram('buddybetes_db_statement_seconds', 'SQLite statement execution time.', ['statement'])
+db_statement_rows = Counter('buddybetes_db_statement_rows_total', 'Rows written or fetched by SQLite statements.', ['statement'])
+scheduler_seconds = Histogram('buddybetes_scheduler_seconds', 'Reminder worker heartbeat and reminder wave durations.', ['phase'])
+smtp_seconds = Histogram('buddybetes_smtp_seconds', 'SMTP connect and per-message send time.', ['operation'])
+writer_commit_seconds = Histogram('buddybetes_writer_commit_seconds', 'Group commit latency of the health_data writer.')
+
+# Recent statements slower than SLOW_QUERY_SECONDS: (wall time, seconds, sql)
+slow_queries = deque(maxlen=SLOW_QUERY_SAMPLES)
+
+def record_statement(sql, seconds, rows=None):
+    """Record one execute(); `rows` is the rowcount of a write, if any."""
+    label = statement_label(sql)
+    db_statement_seconds.observe(seconds, statement=label)
+    if rows:
+        db_statement_rows.inc(rows, statement=label)
+    if seconds >= SLOW_QUERY_SECONDS:
+        slow_queries.append((time.time(), seconds, label))
+
+def record_rows(sql, rows):
+    if rows:
+        db_statement_rows.inc(rows, statement=statement_label(sql))
@@ -0,0 +1,377 @@
+"""Versioned schema migrations for the BuddyBetes SQLite database.
+
+The schema version lives in `PRAGMA user_version`. Each migration runs once,
+in order, inside its own write transaction, and bumps the version when it
+commits. `init_db()` applies pending migrations once per process.
+
+Run `python app/migrations.py --check-plans` to verify that the hot queries
+still use their indexes.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+import pytz
+import yaml
+from cache import DATA_VERSION_QUERY
+from database import connection
+from health_data import DASHBOARD_QUERY, HISTORY_BOUNDS_QUERY, LAST_READING_QUERY, log_page_query
+from deliveries import DUE_REMINDERS_QUERY
+from digest import WEEKLY_STATS_QUERY
+import rollups
+import symptom_tags
+
+logger = logging.getLogger(__name__)
+
+_initialized = False
+_init_lock = threading.Lock()
+
+def _create_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS health_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            glucose_level REAL NOT NULL,
+            bp_systolic INTEGER NOT NULL,
+            bp_diastolic INTEGER NOT NULL,
+            food_intake TEXT,
+            mood TEXT,
+            symptoms TEXT,
+            meal_context TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            name TEXT NOT NULL,
+            password TEXT NOT NULL,
+            email_reminder TEXT DEFAULT 'Daily',
+            reminder_time TEXT DEFAULT '07:58'
+        )
+    ''')
+
+def _index_health_data_by_user(conn):
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_health_data_user_date_time
+        ON health_data (user_id, date, time)
+    ''')
+
+def _surrogate_user_key_and_timestamps(conn):
+    # Give users an integer primary key and rebuild health_data around it,
+    # replacing the TEXT date/time pair with integer epoch seconds.
+    conn.execute('''
+        CREATE TABLE users_v3 (
+            id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            email TEXT NOT NULL,
+            name TEXT NOT NULL,
+            password TEXT NOT NULL,
+            email_reminder TEXT DEFAULT 'Daily',
+            reminder_time TEXT DEFAULT '07:58'
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO users_v3 (username, email, name, password, email_reminder, reminder_time)
+        SELECT username, email, name, password, email_reminder, reminder_time FROM users ORDER BY rowid
+    ''')
+    conn.execute('''
+        CREATE TABLE health_data_v3 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            ts INTEGER NOT NULL,
+            glucose_level REAL NOT NULL,
+            bp_systolic INTEGER NOT NULL,
+            bp_diastolic INTEGER NOT NULL,
+            food_intake TEXT,
+            mood TEXT,
+            symptoms TEXT,
+            meal_context TEXT
+        )
+    ''')
+    copied = conn.execute('''
+        INSERT INTO health_data_v3 (id, user_id, ts, glucose_level, bp_systolic, bp_diastolic, food_intake, mood, symptoms, meal_context)
+        SELECT h.id, u.id, CAST(strftime('%s', h.date || ' ' || h.time) AS INTEGER),
+               COALESCE(h.glucose_level, 0), COALESCE(h.bp_systolic, 0), COALESCE(h.bp_diastolic, 0),
+               h.food_intake, h.mood, h.symptoms, h.meal_context
+        FROM health_data h JOIN users_v3 u ON u.username = h.user_id
+        WHERE strftime('%s', h.date || ' ' || h.time) IS NOT NULL
+    ''').rowcount
+    total = conn.execute('SELECT COUNT(*) FROM health_data').fetchone()[0]
+    if copied != total:
+        # Keep the rows that can't be converted, as they were, for review
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS health_data_rejected (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT,
+                date TEXT,
+                time TEXT,
+                glucose_level REAL,
+                bp_systolic INTEGER,
+                bp_diastolic INTEGER,
+                food_intake TEXT,
+                mood TEXT,
+                symptoms TEXT,
+                meal_context TEXT,
+                reason TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO health_data_rejected
+            SELECT h.*, CASE WHEN u.id IS NULL THEN 'unknown user' ELSE 'unparseable date/time' END
+            FROM health_data h LEFT JOIN users_v3 u ON u.username = h.user_id
+            WHERE u.id IS NULL OR strftime('%s', h.date || ' ' || h.time) IS NULL
+        ''')
+        logger.warning(
+            "Moved %d health_data rows with an unknown user or unparseable date/time to health_data_rejected.",
+            total - copied,
+        )
+    conn.execute('DROP TABLE health_data')
+    conn.execute('DROP TABLE users')
+    conn.execute('ALTER TABLE users_v3 RENAME TO users')
+    conn.execute('ALTER TABLE health_data_v3 RENAME TO health_data')
+    conn.execute('CREATE INDEX idx_health_data_user_ts ON health_data (user_id, ts)')
+
+def _rollup_tables(conn):
+    rollups.create_tables(conn)
+    rollups.rebuild(conn)
+
+def _reminder_coordination_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            old_username TEXT
+        )
+    ''')
+
+# Written by email_notifications before delivery state moved into SQLite
+LAST_SENT_TIMES_PATH = 'last_sent_times.yaml'
+
+def _reminder_deliveries(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_deliveries (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+            last_sent_at INTEGER,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # One-time import of the old YAML dedup state
+    if not os.path.exists(LAST_SENT_TIMES_PATH):
+        return
+    with open(LAST_SENT_TIMES_PATH) as file:
+        last_sent_times = yaml.safe_load(file) or {}
+    manila = pytz.timezone('Asia/Manila')
+    rows = []
+    for username, sent_at in last_sent_times.items():
+        try:
+            moment = datetime.fromisoformat(str(sent_at))
+        except ValueError:
+            logger.warning("Skipping unparseable last sent time %r for %s", sent_at, username)
+            continue
+        if moment.tzinfo is None:
+            moment = manila.localize(moment)
+        rows.append((int(moment.timestamp()), username))
+    imported = conn.executemany('''
+        INSERT OR IGNORE INTO reminder_deliveries (user_id, last_sent_at, status, attempts)
+        SELECT id, ?, 'sent', 1 FROM users WHERE username = ?
+    ''', rows).rowcount
+    logger.info("Imported %d of %d last sent times from %s.", imported, len(last_sent_times), LAST_SENT_TIMES_PATH)
+
+def _index_users_by_reminder_slot(conn):
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_reminder_slot
+        ON users (email_reminder, reminder_time)
+    ''')
+
+def _alert_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_state (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+            last_ts INTEGER,
+            last_glucose REAL,
+            bp_alert_ts INTEGER,
+            high_alert_ts INTEGER,
+            low_alert_ts INTEGER,
+            rate_alert_ts INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            ts INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            glucose_level REAL,
+            bp_systolic INTEGER,
+            bp_diastolic INTEGER,
+            change REAL,
+            created_at INTEGER NOT NULL,
+            dispatched_at INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_outbox_pending
+        ON alert_outbox (id) WHERE dispatched_at IS NULL
+    ''')
+
+def _symptom_tags(conn):
+    symptom_tags.create_table(conn)
+    symptom_tags.rebuild(conn)
+
+def _data_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+            version INTEGER NOT NULL
+        )
+    ''')
+
+def _rollups_without_blanks(conn):
+    # Numeric rollups gain non-blank counts, a glucose sum of squares and
+    # per-range counts, and stop aggregating blank (0) entries; recompute them
+    conn.execute('DROP TABLE IF EXISTS rollup_daily')
+    conn.execute('DROP TABLE IF EXISTS rollup_hourly')
+    rollups.create_tables(conn)
+    rollups.rebuild(conn)
+
+def _alert_claims(conn):
+    conn.execute('ALTER TABLE alert_outbox ADD COLUMN claimed_at INTEGER')
+    conn.execute('ALTER TABLE alert_outbox ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+# Ordered (version, description, apply) triples. Never edit or reorder a
+# migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    (1, "create health_data and users tables", _create_base_tables),
+    (2, "index health_data on (user_id, date, time)", _index_health_data_by_user),
+    (3, "integer user ids and epoch timestamps in health_data", _surrogate_user_key_and_timestamps),
+    (4, "daily, hourly and category rollups of health_data", _rollup_tables),
+    (5, "leader lease and settings change queue for the reminder worker", _reminder_coordination_tables),
+    (6, "reminder delivery state, imported from last_sent_times.yaml", _reminder_deliveries),
+    (7, "index users on (email_reminder, reminder_time)", _index_users_by_reminder_slot),
+    (8, "alert detector state and notification outbox", _alert_tables),
+    (9, "per-day symptom tag counts", _symptom_tags),
+    (10, "per-user data versions shared by every process", _data_versions),
+    (11, "numeric rollups that skip blank entries, with range counts", _rollups_without_blanks),
+    (12, "claims and delivery attempts on the alert outbox", _alert_claims),
+]
+
+# Queries that must be served from an index, with sample parameters.
+HOT_QUERIES = {
+    'analytics_dashboard': (DASHBOARD_QUERY, ('user', 0, 1)),
+    'history_bounds': (HISTORY_BOUNDS_QUERY, ('user',)),
+    'category_counts': (rollups.CATEGORY_COUNTS_QUERY, ('user', 'mood', 0, 1)),
+    'last_reading': (LAST_READING_QUERY, ('user', 0, 1)),
+    'hourly_series': (rollups.HOURLY_SERIES_QUERY, ('user', 0, 1)),
+    'daily_glucose': (rollups.DAILY_GLUCOSE_QUERY, ('user', 0, 1)),
+    'due_reminders': (DUE_REMINDERS_QUERY, ('Daily', '08:00', 0)),
+    'weekly_stats': (WEEKLY_STATS_QUERY, ('[1, 2]', 0, 1)),
+    'symptom_tag_totals': (symptom_tags.TAG_TOTALS_QUERY, ('user', 0, 1)),
+    'symptom_tag_daily_counts': (symptom_tags.TAG_DAILY_COUNTS_QUERY, ('user', '["headache"]', 0, 1)),
+    'log_page': log_page_query('user', 0, 1, after=(1, 1), mood='Happy', meal_context='Other', search='rice'),
+    'data_version': (DATA_VERSION_QUERY, ('user',)),
+}
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations on `conn`, returning the number applied."""
+    applied = 0
+    # Table rebuilds need foreign key enforcement off; integrity is checked
+    # explicitly before each migration commits.
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version, description, apply in MIGRATIONS:
+            applied += _apply(conn, version, description, apply)
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+    if applied:
+        conn.execute('ANALYZE')
+        conn.commit()
+    return applied
+
+def _apply(conn, version, description, apply):
+    # Take the write lock before re-reading the version so concurrent
+    # processes never apply the same migration twice.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if get_schema_version(conn) >= version:
+            conn.rollback()
+            return 0
+        logger.info("Applying migration %d: %s", version, description)
+        apply(conn)
+        violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+        if violations:
+            raise sqlite3.IntegrityError(f"Migration {version} left {len(violations)} foreign key violations")
+        conn.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+        return 1
+    except Exception:
+        conn.rollback()
+        raise
+
+def init_db():
+    """Bring the database schema up to date once per process."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        with connection() as conn:
+            applied = migrate(conn)
+        logger.info("Database schema at version %d (%d migrations applied).", MIGRATIONS[-1][0], applied)
+        _initialized = True
+
+def explain(conn, sql, params=()):
+    """Return the `EXPLAIN QUERY PLAN` detail lines for a query."""
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+def plan_uses_scan(plan):
+    """True when a plan reads a table without an index or sorts its output.
+
+    Temp b-trees for GROUP BY are allowed: they only aggregate rows that an
+    index range already selected.
+    """
+    for detail in plan:
+        if detail.startswith('SCAN') and ' INDEX ' not in detail and ' PRIMARY KEY' not in detail:
+            return True
+        if 'USE TEMP B-TREE FOR ORDER BY' in detail:
+            return True
+    return False
+
+def check_query_plans():
+    """Return {name: plan} for every hot query whose plan regressed to a scan."""
+    failures = {}
+    with connection() as conn:
+        migrate(conn)
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = explain(conn, sql, params)
+            if plan_uses_scan(plan):
+                failures[name] = plan
+    return failures
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if '--check-plans' in sys.argv:
+        failures = check_query_plans()
+        for name, plan in failures.items():
+            print(f"{name}: query plan regressed to a scan: {plan}")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(HOT_QUERIES)} hot queries use an index.")
+    else:
+        init_db()
@@ -0,0 +1,138 @@
+"""Shared password hashing service.
+
+bcrypt costs a few hundred milliseconds of CPU per hash or verify. Run on
+Streamlit script threads, a burst of logins competes for the one server
+process with every other session. All hashing goes through a small process
+pool instead, with:
+
+- a cap on outstanding requests (`MAX_PENDING`); callers past it get
+  `PasswordServiceBusy` instead of queueing without bound,
+- per-username and per-client failed-login throttling (`LoginThrottle`),
+- rehash-on-login: `verify` returns a new hash whenever the stored one was
+  made with a different cost than `BCRYPT_ROUNDS`.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+BCRYPT_ROUNDS = int(os.environ.get('BUDDYBETES_BCRYPT_ROUNDS', '12'))
+HASH_WORKERS = int(os.environ.get('BUDDYBETES_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.environ.get('BUDDYBETES_HASH_MAX_PENDING', str(HASH_WORKERS * 8)))
+# How long a caller waits for a free slot before giving up
+ACQUIRE_TIMEOUT = 5.0
+
+# Failed logins allowed per username or client within the window
+MAX_FAILURES = 5
+FAILURE_WINDOW = 15 * 60
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Too many password operations are already in flight."""
+
+class LoginThrottled(RuntimeError):
+    """Too many recent failed logins for this username or client."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed login attempts. Try again in {int(retry_after // 60) + 1} minutes.")
+        self.retry_after = retry_after
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    """The CryptContext, built on first use so only hashing workers import passlib."""
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+def _hash(password):
+    return pwd_context().hash(password)
+
+def _verify_and_update(password, stored_hash):
+    return pwd_context().verify_and_update(password, stored_hash)
+
+class LoginThrottle:
+    """Sliding-window count of failed logins per key (username or client address)."""
+
+    def __init__(self, max_failures=MAX_FAILURES, window=FAILURE_WINDOW, clock=time.monotonic):
+        self.max_failures = max_failures
+        self.window = window
+        self.clock = clock
+        self._failures = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def _prune(self, failures, now):
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+
+    def check(self, *keys):
+        """Raise LoginThrottled if any key has used up its failures."""
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                if key is None or key not in self._failures:
+                    continue
+                failures = self._failures[key]
+                self._prune(failures, now)
+                if not failures:
+                    del self._failures[key]
+                elif len(failures) >= self.max_failures:
+                    raise LoginThrottled(failures[0] + self.window - now)
+
+    def failed(self, *keys):
+        now = self.clock()
+        with self._lock:
+            for key in keys:
+                if key is not None:
+                    failures = self._failures[key]
+                    self._prune(failures, now)
+                    failures.append(now)
+
+    def succeeded(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+class PasswordService:
+    """Run bcrypt in a bounded process pool."""
+
+    def __init__(self, workers=HASH_WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Never fork the threaded server process itself
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=ACQUIRE_TIMEOUT):
+            raise PasswordServiceBusy("The server is busy. Please try again in a moment.")
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def verify(self, password, stored_hash):
+        """Return (matches, new hash or None); a new hash means the stored one should be replaced."""
+        return self._run(_verify_and_update, password, stored_hash)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+password_service = PasswordService()
+login_throttle = LoginThrottle()
+
+def hash_password(password):
+    return password_service.hash(password)
@@ -0,0 +1,172 @@
+"""Heap-based scheduler for recurring email reminders.
+
+Every user with reminders enabled has one entry in a min-heap ordered by
+next fire time. The scheduler thread sleeps on a condition variable until
+the earliest entry is due (or the heap changes), hands every due reminder
+to `send` as one batch and pushes each user's next occurrence back onto
+the heap.
+
+Settings changes push a fresh entry in O(log n); the superseded entry stays
+in the heap and is skipped when popped. The heap is rebuilt once stale
+entries outnumber live ones.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = ('Daily', 'Weekly')
+
+# Weekly reminders go out on this weekday (Monday) at the user's reminder time
+WEEKLY_REMINDER_WEEKDAY = 0
+
+def next_fire_time(email_reminder, reminder_time, after, tz):
+    """Epoch seconds of the first reminder strictly after `after` (epoch seconds).
+
+    `reminder_time` is 'HH:MM' wall-clock time in `tz`.
+    """
+    hour, minute = (int(part) for part in reminder_time.split(':')[:2])
+    now = datetime.fromtimestamp(after, tz)
+    day = now.date()
+    if email_reminder == 'Weekly':
+        day += timedelta(days=(WEEKLY_REMINDER_WEEKDAY - day.weekday()) % 7)
+    step = timedelta(days=7 if email_reminder == 'Weekly' else 1)
+    while True:
+        candidate = tz.localize(datetime(day.year, day.month, day.day, hour, minute))
+        if candidate.timestamp() > after:
+            return candidate.timestamp()
+        day += step
+
+class ReminderScheduler:
+    """Call `send(due)` with the (username, email_reminder, reminder_time)
+    triples due at each reminder time."""
+
+    def __init__(self, send, tz, clock=time.time):
+        self.send = send
+        self.tz = tz
+        self.clock = clock
+        self._heap = []
+        # username -> (sequence number, frequency, reminder time) of the live entry
+        self._entries = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, rows):
+        """Replace the queue with (username, email_reminder, reminder_time) rows."""
+        now = self.clock()
+        # Many users share a reminder slot; compute each slot's time once
+        fire_times = {}
+        with self._condition:
+            self._heap, self._entries = [], {}
+            for username, email_reminder, reminder_time in rows:
+                entry = self._entry(username, email_reminder, reminder_time, now, fire_times)
+                if entry:
+                    self._heap.append(entry)
+            heapq.heapify(self._heap)
+            self._condition.notify()
+        logger.info("Reminder scheduler loaded %d users.", len(self._entries))
+
+    def update(self, username, email_reminder, reminder_time):
+        """Schedule, reschedule or cancel one user's reminder in O(log n)."""
+        with self._condition:
+            entry = self._entry(username, email_reminder, reminder_time, self.clock())
+            if entry:
+                heapq.heappush(self._heap, entry)
+            else:
+                self._entries.pop(username, None)
+            self._compact()
+            self._condition.notify()
+
+    def remove(self, username):
+        with self._condition:
+            self._entries.pop(username, None)
+            self._compact()
+
+    def _entry(self, username, email_reminder, reminder_time, after, fire_times=None):
+        if email_reminder not in FREQUENCIES or not reminder_time:
+            self._entries.pop(username, None)
+            return None
+        slot = (email_reminder, reminder_time, after)
+        try:
+            if fire_times is not None and slot in fire_times:
+                fire_at = fire_times[slot]
+            else:
+                fire_at = next_fire_time(email_reminder, reminder_time, after, self.tz)
+                if fire_times is not None:
+                    fire_times[slot] = fire_at
+        except ValueError:
+            logger.error("Invalid reminder time %r for %s", reminder_time, username)
+            self._entries.pop(username, None)
+            return None
+        sequence = next(self._sequence)
+        self._entries[username] = (sequence, email_reminder, reminder_time)
+        return (fire_at, sequence, username)
+
+    def _is_live(self, entry):
+        live = self._entries.get(entry[2])
+        return live is not None and live[0] == entry[1]
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def next_due(self):
+        """Epoch seconds of the earliest live reminder, or None."""
+        with self._condition:
+            while self._heap and not self._is_live(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """Pop every reminder due at `now`, rescheduling recurring ones.
+
+        Returns (username, email_reminder, reminder_time) triples to notify.
+        """
+        now = self.clock() if now is None else now
+        due = []
+        fire_times = {}
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if not self._is_live(entry):
+                    continue
+                username = entry[2]
+                _, email_reminder, reminder_time = self._entries[username]
+                due.append((username, email_reminder, reminder_time))
+                heapq.heappush(self._heap, self._entry(username, email_reminder, reminder_time, max(now, entry[0]), fire_times))
+        return due
+
+    def run(self):
+        """Sleep until reminders are due and fire them, until `stop()`."""
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                fire_at = self.next_due()
+                delay = None if fire_at is None else fire_at - self.clock()
+                if delay is None or delay > 0:
+                    self._condition.wait(delay)
+                    continue
+            due = self.pop_due()
+            if not due:
+                continue
+            self.fired += len(due)
+            try:
+                self.send(due)
+            except Exception as e:
+                logger.error("Sending %d reminders failed: %s", len(due), e)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
@@ -0,0 +1,154 @@
+"""Standalone reminder worker.
+
+Run one or more of these next to the web app:
+
+    python app/reminder_worker.py
+
+Workers, and web processes running the embedded worker thread, compete for
+the `reminders` lease. Only the holder runs the reminder scheduler, so
+adding replicas never multiplies email sends. The holder renews the lease
+every heartbeat; if it dies, another worker takes over once the lease
+expires.
+
+Settings changes made by any process are queued in `reminder_changes` and
+applied by the leader on its next heartbeat. The leader also emails any
+out-of-range alerts waiting in `alert_outbox` on every heartbeat.
+
+With `BUDDYBETES_METRICS_FILE` set, every heartbeat also writes the
+process's metrics there in the Prometheus text format.
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from database import connection
+import metrics
+from leases import Lease
+from reminder_scheduler import ReminderScheduler
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'reminders'
+LEASE_TTL = 30.0
+HEARTBEAT_SECONDS = 5.0
+
+def queue_reminder_change(username, old_username=None):
+    """Ask the leader to reload a user's reminder settings (and drop a renamed user)."""
+    with connection() as conn:
+        conn.execute('INSERT INTO reminder_changes (username, old_username) VALUES (?, ?)', (username, old_username))
+
+class ReminderWorker:
+    """Hold the reminders lease and run the scheduler while it is held."""
+
+    def __init__(self, send, load_settings, load_all_settings, tz, heartbeat=HEARTBEAT_SECONDS, lease_ttl=LEASE_TTL, dispatch_alerts=None,
+                 on_heartbeat=None):
+        self.send = send
+        self.dispatch_alerts = dispatch_alerts
+        self.on_heartbeat = on_heartbeat
+        self.load_settings = load_settings
+        self.load_all_settings = load_all_settings
+        self.tz = tz
+        self.heartbeat = heartbeat
+        self.lease = Lease(LEASE_NAME, ttl=lease_ttl)
+        self.scheduler = None
+        self._scheduler_thread = None
+        self._last_change_id = 0
+        self._stop = threading.Event()
+
+    def _send_if_leader(self, due):
+        # The lease may have lapsed while the scheduler slept; never send
+        # unless this process still owns it.
+        if not self.lease.held():
+            logger.warning("Skipping %d reminders: reminders lease not held", len(due))
+            return
+        with metrics.scheduler_seconds.time(phase='reminder_wave'):
+            self.send(due)
+
+    def _start_scheduler(self):
+        with connection() as conn:
+            self._last_change_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM reminder_changes').fetchone()[0]
+        self.scheduler = ReminderScheduler(self._send_if_leader, self.tz)
+        self.scheduler.load(self.load_all_settings())
+        self._scheduler_thread = threading.Thread(target=self.scheduler.run, name="reminder-scheduler", daemon=True)
+        self._scheduler_thread.start()
+
+    def _stop_scheduler(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self._scheduler_thread.join(timeout=self.heartbeat)
+            self.scheduler = self._scheduler_thread = None
+
+    def apply_changes(self):
+        """Apply queued settings changes to the running scheduler."""
+        with connection() as conn:
+            changes = conn.execute(
+                'SELECT id, username, old_username FROM reminder_changes WHERE id > ? ORDER BY id',
+                (self._last_change_id,),
+            ).fetchall()
+        for change_id, username, old_username in changes:
+            if old_username and old_username != username:
+                self.scheduler.remove(old_username)
+            email_reminder, reminder_time = self.load_settings(username)
+            self.scheduler.update(username, email_reminder, reminder_time)
+            self._last_change_id = change_id
+        if changes:
+            with connection() as conn:
+                conn.execute('DELETE FROM reminder_changes WHERE id <= ?', (self._last_change_id,))
+            logger.info("Applied %d reminder setting changes.", len(changes))
+
+    def tick(self):
+        """One heartbeat: renew or take the lease and follow its state."""
+        try:
+            leader = self.lease.acquire()
+        except Exception as e:
+            logger.error("Lease heartbeat failed: %s", e)
+            leader = self.lease.held()
+        if leader and self.scheduler is None:
+            logger.info("Became reminder leader; starting scheduler.")
+            self._start_scheduler()
+        elif not leader and self.scheduler is not None:
+            logger.info("No longer reminder leader; stopping scheduler.")
+            self._stop_scheduler()
+        if self.scheduler is not None:
+            self.apply_changes()
+            if self.dispatch_alerts is not None and self.lease.held():
+                with metrics.scheduler_seconds.time(phase='alerts'):
+                    self.dispatch_alerts()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                with metrics.scheduler_seconds.time(phase='heartbeat'):
+                    self.tick()
+                if self.on_heartbeat is not None:
+                    self.on_heartbeat()
+            except Exception as e:
+                logger.error("Reminder worker heartbeat error: %s", e)
+            self._stop.wait(self.heartbeat)
+        self._stop_scheduler()
+        self.lease.release()
+
+    def stop(self):
+        self._stop.set()
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    from migrations import init_db
+    from email_notifications import PHT, close_mailer, load_all_reminder_settings, load_reminder_settings, send_alerts, send_reminders
+
+    init_db()
+    worker = ReminderWorker(
+        send_reminders, load_reminder_settings, load_all_reminder_settings, PHT,
+        dispatch_alerts=send_alerts, on_heartbeat=metrics.write_textfile,
+    )
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+    close_mailer(timeout=60)
+
+if __name__ == "__main__":
+    main()
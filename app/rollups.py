@@ -0,0 +1,153 @@
+"""Pre-aggregated daily and hourly rollups of health_data.
+
+Rollups are maintained incrementally in the same transaction as every
+insert: the writer notes the highest health_data id before inserting and
+folds the rows above it into the rollup tables with one set-based upsert per
+table. `rebuild()` recomputes them from raw data.
+
+Buckets are stored as the epoch seconds of their start, so they decode with
+`pd.to_datetime(..., unit='s')` exactly like health_data.ts.
+"""
+from database import USER_ID_SUBQUERY
+from targets import TARGET_HIGH, TARGET_LOW, VERY_HIGH, VERY_LOW
+
+DAY = 86400
+HOUR = 3600
+
+# Categorical columns counted per user per day
+CATEGORIES = ('mood', 'meal_context')
+
+_MEASURES = ('glucose_level', 'bp_systolic', 'bp_diastolic')
+
+# Glucose readings per target range, for time in range without raw rows.
+# Changing a threshold in targets.py needs a `rebuild()`.
+_GLUCOSE_RANGES = {
+    'glucose_very_low': f'< {VERY_LOW}',
+    'glucose_below': f'< {TARGET_LOW}',
+    'glucose_above': f'> {TARGET_HIGH}',
+    'glucose_very_high': f'> {VERY_HIGH}',
+}
+
+def _numeric_aggregates():
+    """(column, aggregate over new rows, merge with the stored value) triples.
+
+    A measure stored as 0 is a blank form entry, so every aggregate skips
+    it; `{measure}_count` counts the non-blank values the means divide by.
+    """
+    columns = []
+    for m in _MEASURES:
+        value = f'NULLIF({m}, 0)'
+        columns += [
+            (f'{m}_count', f'COUNT({value})', f'{m}_count + excluded.{m}_count'),
+            (f'{m}_sum', f'TOTAL({value})', f'{m}_sum + excluded.{m}_sum'),
+            # Two-argument MIN/MAX return NULL if either side is NULL
+            (f'{m}_min', f'MIN({value})', f'MIN(COALESCE({m}_min, excluded.{m}_min), COALESCE(excluded.{m}_min, {m}_min))'),
+            (f'{m}_max', f'MAX({value})', f'MAX(COALESCE({m}_max, excluded.{m}_max), COALESCE(excluded.{m}_max, {m}_max))'),
+        ]
+    columns.append(('glucose_level_sumsq', 'TOTAL(NULLIF(glucose_level, 0) * glucose_level)', 'glucose_level_sumsq + excluded.glucose_level_sumsq'))
+    columns += [
+        (column, f'SUM(glucose_level > 0 AND glucose_level {test})', f'{column} + excluded.{column}')
+        for column, test in _GLUCOSE_RANGES.items()
+    ]
+    return columns
+
+def _numeric_rollup_sql(table, bucket_column, bucket_seconds):
+    aggregates = _numeric_aggregates()
+    columns = ', '.join(column for column, _, _ in aggregates)
+    selects = ', '.join(aggregate for _, aggregate, _ in aggregates)
+    updates = ', '.join(f'{column} = {merge}' for column, _, merge in aggregates)
+    return (
+        f"INSERT INTO {table} (user_id, {bucket_column}, readings, {columns}) "
+        f"SELECT user_id, ts - ts % {bucket_seconds}, COUNT(*), {selects} "
+        f"FROM health_data WHERE id > ? {{user_filter}} GROUP BY user_id, ts - ts % {bucket_seconds} "
+        f"ON CONFLICT (user_id, {bucket_column}) DO UPDATE SET readings = readings + excluded.readings, {updates}"
+    )
+
+_CATEGORY_ROLLUP_SQL = (
+    "INSERT INTO rollup_category_daily (user_id, category, day, value, readings) "
+    + " UNION ALL ".join(
+        f"SELECT user_id, '{category}', ts - ts % {DAY}, {category}, COUNT(*) FROM health_data "
+        f"WHERE id > ? {{user_filter}} AND {category} IS NOT NULL GROUP BY user_id, ts - ts % {DAY}, {category}"
+        for category in CATEGORIES
+    )
+    + " ON CONFLICT (user_id, category, day, value) DO UPDATE SET readings = readings + excluded.readings"
+)
+
+_ROLLUPS = (
+    ('rollup_daily', _numeric_rollup_sql('rollup_daily', 'day', DAY), 1),
+    ('rollup_hourly', _numeric_rollup_sql('rollup_hourly', 'hour', HOUR), 1),
+    ('rollup_category_daily', _CATEGORY_ROLLUP_SQL, len(CATEGORIES)),
+)
+
+# Per-value counts of a category over a [start, end) window of days
+CATEGORY_COUNTS_QUERY = (
+    "SELECT value, SUM(readings) AS readings FROM rollup_category_daily "
+    f"WHERE user_id = {USER_ID_SUBQUERY} AND category = ? AND day >= ? AND day < ? "
+    "GROUP BY value"
+)
+
+# Hourly means and extremes over a [start, end) window of hours
+HOURLY_SERIES_QUERY = (
+    "SELECT hour, glucose_level_sum / NULLIF(glucose_level_count, 0) AS glucose_level, glucose_level_min, glucose_level_max, "
+    "bp_systolic_sum / NULLIF(bp_systolic_count, 0) AS bp_systolic, bp_diastolic_sum / NULLIF(bp_diastolic_count, 0) AS bp_diastolic "
+    f"FROM rollup_hourly WHERE user_id = {USER_ID_SUBQUERY} AND hour >= ? AND hour < ? ORDER BY hour"
+)
+
+# Per-day glucose aggregates over a [start, end) window of days
+DAILY_GLUCOSE_QUERY = (
+    "SELECT day, glucose_level_count AS count, glucose_level_sum AS sum, glucose_level_sumsq AS sumsq, "
+    + ', '.join(f"{column} AS {column.removeprefix('glucose_')}" for column in _GLUCOSE_RANGES)
+    + f" FROM rollup_daily WHERE user_id = {USER_ID_SUBQUERY} AND day >= ? AND day < ? AND glucose_level_count > 0 ORDER BY day"
+)
+
+def create_tables(conn):
+    def column_type(column):
+        if column.endswith(('_min', '_max')):
+            return 'REAL'
+        return 'INTEGER NOT NULL' if column.endswith('_count') or column in _GLUCOSE_RANGES else 'REAL NOT NULL'
+
+    measures = ''.join(f'{column} {column_type(column)}, ' for column, _, _ in _numeric_aggregates())
+    for table, bucket in (('rollup_daily', 'day'), ('rollup_hourly', 'hour')):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                {bucket} INTEGER NOT NULL,
+                readings INTEGER NOT NULL,
+                {measures}
+                PRIMARY KEY (user_id, {bucket})
+            ) WITHOUT ROWID
+        ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_category_daily (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            category TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            readings INTEGER NOT NULL,
+            PRIMARY KEY (user_id, category, day, value)
+        ) WITHOUT ROWID
+    ''')
+
+def last_reading_id(conn):
+    """Highest health_data id so far; pass it to `apply_since` after inserting."""
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM health_data').fetchone()[0]
+
+def apply_since(conn, after_id, user_id=None):
+    """Fold every health_data row with id > `after_id` into the rollups.
+
+    Must run in the inserting transaction so the rows above `after_id` are
+    exactly the ones that transaction added.
+    """
+    user_filter = '' if user_id is None else 'AND user_id = ?'
+    for _, sql, selects in _ROLLUPS:
+        params = (after_id,) if user_id is None else (after_id, user_id)
+        conn.execute(sql.format(user_filter=user_filter), params * selects)
+
+def rebuild(conn, user_id=None):
+    """Recompute the rollups from raw health_data, for one user or everyone."""
+    for table, _, _ in _ROLLUPS:
+        if user_id is None:
+            conn.execute(f'DELETE FROM {table}')
+        else:
+            conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+    apply_since(conn, 0, user_id)
@@ -1,27 +1,25 @@
 import os
 import sys
 import streamlit as st
-from app_pages.login import login_user
-from app_pages.register import register_user
-from app_pages.log_data import log_data_form
-from app_pages.analytics import analytics_dashboard
-from app_pages.profile import profile_management
-from app_pages.settings import settings
-
-from database import create_tables, create_user_table
-from email_notifications import start_scheduler_thread
-from passlib.context import CryptContext
 
 # Set the Streamlit page configuration
 st.set_page_config(page_title="BuddyBetes", page_icon="images/page_icon.png")
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'app')))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# This script re-executes on every rerun, so process-wide setup is cached as
+# a resource: migrations and the reminder worker start once per process.
+@st.cache_resource
+def initialize_process():
+    from migrations import init_db
+    from email_notifications import start_scheduler_thread
+    init_db()
+    start_scheduler_thread()
+
+initialize_process()
 
-# Initialize the database
-create_tables()
-create_user_table()
+from auth import is_admin
+from metrics import page_seconds
 
 # Initialize session state keys
 def initialize_session_state():
@@ -38,8 +36,11 @@ def initialize_session_state():
     if 'dialog_shown' not in st.session_state:
         st.session_state['dialog_shown'] = False
 
+# st.experimental_dialog was renamed to st.dialog in newer Streamlit releases
+dialog = getattr(st, "dialog", None) or st.experimental_dialog
+
 # Dialog function
-@st.experimental_dialog("Welcome to BuddyBetes MVP 🎉", width="large")
+@dialog("Welcome to BuddyBetes MVP 🎉", width="large")
 def welcome_dialog():
     st.markdown("**👋 Hi there! Thank you for trying out the MVP of BuddyBetes. We're excited to have you here!**")
     st.markdown("### Important Information 📢")
@@ -52,7 +53,7 @@ def welcome_dialog():
 
     if st.button("Okay"):
         st.session_state['dialog_shown'] = True
-        st.experimental_rerun()
+        st.rerun()
 
 # Main function to run the app
 def main():
@@ -80,6 +81,8 @@ def main():
             st.session_state['page'] = 'Profile'
         if st.sidebar.button("Email Notifications"):
             st.session_state['page'] = 'Settings'
+        if is_admin(st.session_state['username']) and st.sidebar.button("Diagnostics"):
+            st.session_state['page'] = 'Diagnostics'
         if st.sidebar.button("Logout"):
             logout_user()
         
@@ -93,39 +96,54 @@ def main():
         if st.sidebar.button("Create an Account"):
             st.session_state['page'] = 'Register'
 
-    if st.session_state['page'] == 'Login':
-        login_user()
-    elif st.session_state['page'] == 'Register':
-        register_user()
-    elif st.session_state['page'] == 'Log Data':
-        if st.session_state.get("authentication_status"):
-            log_data_form(st.session_state.get("username"))
-        else:
-            st.warning("Please log in to log your health data.")
-    elif st.session_state['page'] == 'Analytics':
-        if st.session_state.get("authentication_status"):
-            analytics_dashboard(st.session_state.get("username"))
-        else:
-            st.warning("Please log in to view analytics.")
-    elif st.session_state['page'] == 'Profile':
-        if st.session_state.get("authentication_status"):
-            profile_management(st.session_state.get("username"))
-        else:
-            st.warning("Please log in to view your profile.")
-    elif st.session_state['page'] == 'Settings':
-        if st.session_state.get("authentication_status"):
-            settings(st.session_state.get("username"))
-        else:
-            st.warning("Please log in to access settings.")
+    # Page modules (and the libraries they use, such as pandas and
+    # matplotlib) are imported the first time their page is opened
+    page = st.session_state['page']
+    with page_seconds.time(page=page):
+        if page == 'Login':
+            from app_pages.login import login_user
+            login_user()
+        elif page == 'Register':
+            from app_pages.register import register_user
+            register_user()
+        elif page == 'Log Data':
+            if st.session_state.get("authentication_status"):
+                from app_pages.log_data import log_data_form
+                log_data_form(st.session_state.get("username"))
+            else:
+                st.warning("Please log in to log your health data.")
+        elif page == 'Analytics':
+            if st.session_state.get("authentication_status"):
+                from app_pages.analytics import analytics_dashboard
+                analytics_dashboard(st.session_state.get("username"))
+            else:
+                st.warning("Please log in to view analytics.")
+        elif page == 'Profile':
+            if st.session_state.get("authentication_status"):
+                from app_pages.profile import profile_management
+                profile_management(st.session_state.get("username"))
+            else:
+                st.warning("Please log in to view your profile.")
+        elif page == 'Settings':
+            if st.session_state.get("authentication_status"):
+                from app_pages.settings import settings
+                settings(st.session_state.get("username"))
+            else:
+                st.warning("Please log in to access settings.")
+        elif page == 'Diagnostics':
+            if st.session_state.get("authentication_status") and is_admin(st.session_state.get("username")):
+                from app_pages.diagnostics import diagnostics
+                diagnostics()
+            else:
+                st.warning("Diagnostics are only available to administrators.")
 
 def logout_user():
     st.session_state['authentication_status'] = None
     st.session_state['name'] = None
     st.session_state['username'] = None
+    st.session_state.pop('user_record', None)
     st.session_state['page'] = 'Login'
     st.success("You have been logged out successfully.")
 
-start_scheduler_thread()
-
 if __name__ == "__main__":
     main()
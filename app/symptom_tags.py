@@ -0,0 +1,96 @@
+"""Normalized symptom tags with per-day counts.
+
+The log form stores symptoms as free text ("Headache, dizzy and tired.").
+At write time each reading's text is split into short normalized tags
+("headache", "dizzy", "tired") and counted per user, tag and day in
+`symptom_tag_daily`, in the inserting transaction like the rollups. Charts
+read a window's top tags from there, so their size is bounded by
+days × `TOP_TAGS` no matter how many distinct sentences were typed.
+
+Days are epoch seconds of their start, like the rollups.
+"""
+import heapq
+import json
+import re
+from database import USER_ID_SUBQUERY
+from rollups import DAY
+
+# Tags shown in the symptoms chart
+TOP_TAGS = 8
+MAX_TAG_LENGTH = 40
+
+_SEPARATORS = re.compile(r"[,;/|\n.!?+&]+|\band\b|\bwith\b")
+_NOT_SYMPTOMS = {'', 'none', 'no', 'nothing', 'n/a', 'na', 'nil', 'ok', 'okay', 'fine', '-'}
+
+# Readings per tag over a [start, end) window of days
+TAG_TOTALS_QUERY = (
+    "SELECT tag, SUM(readings) FROM symptom_tag_daily "
+    f"WHERE user_id = {USER_ID_SUBQUERY} AND day >= ? AND day < ? GROUP BY tag"
+)
+
+# Daily counts of the tags in a JSON array over a [start, end) window
+TAG_DAILY_COUNTS_QUERY = (
+    "SELECT day, tag, readings FROM symptom_tag_daily "
+    f"WHERE user_id = {USER_ID_SUBQUERY} AND tag IN (SELECT value FROM json_each(?)) AND day >= ? AND day < ?"
+)
+
+_RECORD_TAGS = '''
+    INSERT INTO symptom_tag_daily (user_id, tag, day, readings) VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, tag, day) DO UPDATE SET readings = readings + excluded.readings
+'''
+
+def normalize_tags(text):
+    """The distinct normalized tags in a free-text symptoms entry."""
+    if not text or text.strip().lower() in _NOT_SYMPTOMS:
+        return set()
+    tags = set()
+    for part in _SEPARATORS.split(text.lower()):
+        tag = ' '.join(part.strip(" \t'\"()[]-:").split())[:MAX_TAG_LENGTH]
+        if tag not in _NOT_SYMPTOMS:
+            tags.add(tag)
+    return tags
+
+def top_tag_counts(conn, username, start_ts, end_ts, k=TOP_TAGS):
+    """(day, tag, readings) rows for the window's `k` most frequent tags."""
+    totals = conn.execute(TAG_TOTALS_QUERY, (username, start_ts, end_ts)).fetchall()
+    top = [tag for tag, _ in heapq.nsmallest(k, totals, key=lambda total: (-total[1], total[0]))]
+    if not top:
+        return []
+    return conn.execute(TAG_DAILY_COUNTS_QUERY, (username, json.dumps(top), start_ts, end_ts)).fetchall()
+
+def create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS symptom_tag_daily (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            tag TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            readings INTEGER NOT NULL,
+            PRIMARY KEY (user_id, tag, day)
+        ) WITHOUT ROWID
+    ''')
+
+def apply_since(conn, after_id, user_id=None):
+    """Count the tags of every health_data row with id > `after_id`.
+
+    Same contract as `rollups.apply_since`: run it in the inserting
+    transaction.
+    """
+    sql = "SELECT user_id, ts, symptoms FROM health_data WHERE id > ? AND symptoms IS NOT NULL AND symptoms != ''"
+    params = (after_id,)
+    if user_id is not None:
+        sql += ' AND user_id = ?'
+        params += (user_id,)
+    counts = {}
+    for row_user_id, ts, text in conn.execute(sql, params):
+        for tag in normalize_tags(text):
+            key = (row_user_id, tag, ts - ts % DAY)
+            counts[key] = counts.get(key, 0) + 1
+    conn.executemany(_RECORD_TAGS, ((*key, readings) for key, readings in counts.items()))
+
+def rebuild(conn, user_id=None):
+    """Recompute the tag counts from raw health_data, for one user or everyone."""
+    if user_id is None:
+        conn.execute('DELETE FROM symptom_tag_daily')
+    else:
+        conn.execute('DELETE FROM symptom_tag_daily WHERE user_id = ?', (user_id,))
+    apply_since(conn, 0, user_id)
@@ -0,0 +1,6 @@
+"""Consensus glucose targets (mg/dL), shared by the metrics, alerts and digests."""
+
+VERY_LOW = 54
+TARGET_LOW = 70
+TARGET_HIGH = 180
+VERY_HIGH = 250
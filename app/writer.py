@@ -0,0 +1,181 @@
+"""Single-writer group commit for SQLite.
+
+SQLite allows one writer at a time. When many sessions insert at once, each
+in its own transaction, they queue on the write lock, retry on
+`busy_timeout` and occasionally fail with "database is locked". A
+`GroupCommitWriter` owns one writer thread instead: callers put requests on
+a bounded queue, the thread collects whatever arrives within `linger`
+seconds and applies the whole batch in a single transaction, one savepoint
+per request so a bad request fails alone.
+
+`submit()` returns a Future that resolves only after the batch has
+committed, so a caller that waits on it has a durable acknowledgment;
+`call()` submits and waits with a bounded timeout. If the batch's
+transaction fails as a whole (e.g. the write lock stays busy), every
+request in it fails with that error.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from database import connection
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE = int(os.environ.get('BUDDYBETES_WRITER_QUEUE', '1000'))
+MAX_BATCH = 256
+LINGER_SECONDS = float(os.environ.get('BUDDYBETES_WRITER_LINGER_MS', '2')) / 1000
+# How long submit() waits for room in a full queue
+SUBMIT_TIMEOUT = 5.0
+# How long call() waits for a queued request to commit
+COMMIT_TIMEOUT = 30.0
+# Commits kept for the latency percentiles in stats()
+LATENCY_SAMPLES = 1000
+
+class WriterBusy(RuntimeError):
+    """The write queue stayed full for longer than the submit timeout."""
+
+class GroupCommitWriter:
+    """Apply `apply(conn, *args)` requests from one thread, many per transaction.
+
+    `after_commit(args, result)` runs for each request once its batch has
+    committed and before its Future resolves.
+    """
+
+    def __init__(self, apply, after_commit=None, max_queue=MAX_QUEUE, max_batch=MAX_BATCH,
+                 linger=LINGER_SECONDS, name='writer'):
+        self.apply = apply
+        self.after_commit = after_commit
+        self.max_batch = max_batch
+        self.linger = linger
+        self.name = name
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.batches = 0
+        self.requests = 0
+        self.failures = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, *args, timeout=SUBMIT_TIMEOUT):
+        """Queue a request; the returned Future resolves after its commit."""
+        self._start()
+        future = Future()
+        try:
+            self._queue.put((future, args), timeout=timeout)
+        except queue.Full:
+            raise WriterBusy("Too many writes are queued. Please try again in a moment.")
+        return future
+
+    def call(self, *args, timeout=COMMIT_TIMEOUT):
+        """Submit a request and wait for its commit; returns `apply`'s result.
+
+        Raises WriterBusy if the queue is full or the commit takes longer
+        than `timeout` seconds.
+        """
+        future = self.submit(*args)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise WriterBusy("Too many writes are queued. Please try again in a moment.")
+            raise WriterBusy("Saving is taking longer than usual; check whether it went through before retrying.")
+
+    def stop(self, timeout=None):
+        """Commit what is queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            requests = [request for request in batch if request is not None]
+            if requests:
+                self._commit(requests)
+            if stop:
+                return
+
+    def _commit(self, requests):
+        started = time.perf_counter()
+        done = []
+        try:
+            with connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for future, args in requests:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute('SAVEPOINT request')
+                    try:
+                        result = self.apply(conn, *args)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO request')
+                        conn.execute('RELEASE request')
+                        future.set_exception(e)
+                        self.failures += 1
+                        continue
+                    conn.execute('RELEASE request')
+                    done.append((future, args, result))
+        except Exception as e:
+            # The transaction rolled back: fail every request not already
+            # failed or cancelled, including those never reached
+            logger.error("%s: group commit of %d requests failed: %s", self.name, len(requests), e)
+            for future, _ in requests:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+                    self.failures += 1
+            return
+        elapsed = time.perf_counter() - started
+        self._latencies.append(elapsed)
+        metrics.writer_commit_seconds.observe(elapsed)
+        self.batches += 1
+        self.requests += len(done)
+        for future, args, result in done:
+            if self.after_commit is not None:
+                try:
+                    self.after_commit(args, result)
+                except Exception as e:
+                    logger.error("%s: after_commit hook failed: %s", self.name, e)
+            future.set_result(result)
+
+    def stats(self):
+        """Queue depth, throughput counters and commit latency (seconds)."""
+        latencies = sorted(self._latencies)
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] if latencies else 0.0
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches': self.batches,
+            'requests': self.requests,
+            'failures': self.failures,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'commit_latency_p50': percentile(0.5),
+            'commit_latency_p95': percentile(0.95),
+            'commit_latency_max': latencies[-1] if latencies else 0.0,
+        }
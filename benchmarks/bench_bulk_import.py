@@ -0,0 +1,56 @@
+"""Benchmark bulk import throughput of CSV and JSON exports.
+
+Usage: python benchmarks/bench_bulk_import.py [--rows 500000] [--format csv|json]
+
+Imports into a throwaway database, then imports the same file again to time
+the duplicate-detection path.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+def build_export(rows, file_format):
+    start = 1704067200  # 2024-01-01T00:00:00
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        buffer.write("timestamp,glucose_level,meal_context\n")
+        for i in range(rows):
+            buffer.write(f"{start + i * 300},{100 + (i * 7) % 120},Other\n")
+    else:
+        for i in range(rows):
+            buffer.write(json.dumps({'timestamp': start + i * 300, 'sgv': 100 + (i * 7) % 120}) + "\n")
+    return buffer.getvalue().encode()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.join(tmp, 'bench.db')
+        from database import close_pool, connection
+        from migrations import init_db
+        from bulk_import import import_readings
+
+        init_db()
+        with connection() as conn:
+            conn.execute("INSERT INTO users (username, email, name, password) VALUES ('bench', 'bench@example.com', 'Bench', 'x')")
+
+        data = build_export(args.rows, args.format)
+        for label in ('fresh', 'duplicate'):
+            start = time.perf_counter()
+            report = import_readings('bench', io.BytesIO(data), args.format)
+            elapsed = time.perf_counter() - start
+            print(f"{label}: rows={report['rows']} inserted={report['inserted']} duplicates={report['duplicates']} "
+                  f"errors={report['error_count']} elapsed={elapsed:.2f}s rate={report['rows'] / elapsed:,.0f} rows/s")
+        close_pool()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Memory benchmark of the analytics chart layer over many reruns.
+
+Usage: python benchmarks/bench_charts.py [--reruns 10000] [--datasets 90] [--legacy 0]
+
+Each rerun renders the dashboard's two pie charts and the symptoms chart
+for one of `--datasets` random aggregates, so the bounded chart cache both
+hits and evicts. Resident memory is sampled every tenth of the run; it
+should stay flat once the cache is full. With `--legacy N`, the old pattern
+(pyplot figures that are never closed) is run N times first for comparison.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+import pandas as pd
+
+MOODS = ('Happy', 'Neutral', 'Sad', 'Stressed', 'Tired')
+TAGS = ('headache', 'dizzy', 'tired', 'thirsty', 'nausea', 'shaky')
+
+def rss_mb():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+def dataset(seed):
+    rng = random.Random(seed)
+    moods = pd.Series([rng.randint(1, 20) for _ in MOODS], index=list(MOODS), name='readings')
+    days = pd.date_range('2024-01-01', periods=14, freq='D', name='day')
+    symptoms = pd.DataFrame({tag: [rng.randint(0, 3) for _ in days] for tag in TAGS}, index=days)
+    return moods, symptoms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=10000)
+    parser.add_argument('--datasets', type=int, default=90)
+    parser.add_argument('--legacy', type=int, default=0)
+    args = parser.parse_args()
+
+    from cache import chart_cache
+    from charts import pie_chart, symptoms_chart
+
+    datasets = [dataset(seed) for seed in range(args.datasets)]
+    rng = random.Random(0)
+
+    if args.legacy:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        before = rss_mb()
+        for i in range(args.legacy):
+            moods, symptoms = datasets[i % len(datasets)]
+            for _ in range(3):
+                fig, ax = plt.subplots()
+                ax.pie(moods, labels=moods.index)
+        print(f"legacy pyplot, {args.legacy} reruns: {len(plt.get_fignums())} open figures, RSS {before:.0f} -> {rss_mb():.0f} MB")
+        plt.close('all')
+
+    samples = []
+    start = time.perf_counter()
+    for i in range(args.reruns):
+        moods, symptoms = rng.choice(datasets)
+        pie_chart(moods)
+        pie_chart(moods.iloc[::-1])
+        symptoms_chart(symptoms)
+        if (i + 1) % max(1, args.reruns // 10) == 0:
+            samples.append(rss_mb())
+    elapsed = time.perf_counter() - start
+
+    stats = chart_cache.stats()
+    print(f"{args.reruns} reruns in {elapsed:.1f}s, chart cache hit rate {stats['hit_rate']:.0%} ({stats['entries']}/{stats['max_entries']} entries)")
+    print("RSS (MB) per tenth: " + ', '.join(f"{sample:.0f}" for sample in samples))
+    print(f"growth over the second half: {samples[-1] - samples[len(samples) // 2 - 1]:+.1f} MB")
+
+if __name__ == "__main__":
+    main()
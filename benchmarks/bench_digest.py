@@ -0,0 +1,71 @@
+"""Benchmark weekly digest generation for a large reminder wave.
+
+Usage: python benchmarks/bench_digest.py [--users 50000] [--readings-per-day 4] [--budget 5.0]
+
+Seeds a throwaway database with a week of readings per user, then times the
+grouped stats query and template rendering for every user at once. Exits
+non-zero if the wave takes longer than the budget (seconds).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+def seed(conn, users, readings_per_day, end_ts):
+    conn.executemany(
+        "INSERT INTO users (id, username, email, name, password, email_reminder) VALUES (?, ?, ?, ?, 'x', 'Weekly')",
+        ((i, f"user{i}", f"user{i}@example.com", f"User {i}") for i in range(1, users + 1)),
+    )
+    step = 86400 // readings_per_day
+    rng = random.Random(0)
+    conn.executemany(
+        "INSERT INTO health_data (user_id, ts, glucose_level, bp_systolic, bp_diastolic) VALUES (?, ?, ?, 0, 0)",
+        (
+            (user_id, end_ts - 7 * 86400 + n * step, rng.randint(50, 260))
+            for user_id in range(1, users + 1)
+            for n in range(7 * readings_per_day)
+        ),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--readings-per-day', type=int, default=4)
+    parser.add_argument('--budget', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.join(tmp, 'bench.db')
+        import pytz
+        from database import close_pool, connection
+        from migrations import init_db
+        from digest import render_digests, week_window, weekly_stats
+
+        init_db()
+        tz = pytz.timezone('Asia/Manila')
+        start_ts, end_ts = week_window(time.time(), tz)
+        start = time.perf_counter()
+        with connection() as conn:
+            seed(conn, args.users, args.readings_per_day, end_ts)
+        print(f"seeded {args.users:,} users x {7 * args.readings_per_day} readings in {time.perf_counter() - start:.1f}s")
+
+        recipients = [(user_id, f"User {user_id}") for user_id in range(1, args.users + 1)]
+        start = time.perf_counter()
+        with connection() as conn:
+            stats = weekly_stats(conn, [user_id for user_id, _ in recipients], start_ts, end_ts)
+        query_elapsed = time.perf_counter() - start
+        digests = list(render_digests(recipients, stats))
+        elapsed = time.perf_counter() - start
+        close_pool()
+
+    print(f"stats query: {query_elapsed:.2f}s, render: {elapsed - query_elapsed:.2f}s, total: {elapsed:.2f}s for {len(digests):,} digests")
+    if elapsed > args.budget:
+        print(f"over budget ({args.budget:.1f}s)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark the glycemic metrics engine on a year of 5-minute CGM readings.
+
+Usage: python benchmarks/bench_glycemic.py [--days 365] [--repeat 5] [--budget 1.0]
+Exits non-zero if the best run exceeds the budget in seconds.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+from glycemic import glycemic_summary
+
+def synthetic_cgm(days, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-01', periods=days * 288, freq='5min')
+    minutes = index.hour.to_numpy() * 60 + index.minute.to_numpy()
+    # Three meal peaks a day on top of a slow random walk
+    meals = sum(60 * np.exp(-((minutes - peak) % 1440) / 90.0) * (((minutes - peak) % 1440) < 360) for peak in (480, 780, 1140))
+    drift = np.cumsum(rng.normal(0, 1.5, len(index)))
+    drift -= np.convolve(drift, np.ones(288) / 288, mode='same')
+    glucose = np.clip(110 + meals + drift + rng.normal(0, 4, len(index)), 40, 400)
+    return pd.Series(glucose, index=index, name='glucose_level')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.0)
+    args = parser.parse_args()
+
+    series = synthetic_cgm(args.days)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        summary = glycemic_summary(series)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"readings={len(series)} best={best * 1000:.1f}ms median={sorted(timings)[len(timings) // 2] * 1000:.1f}ms")
+    print(f"TIR={summary['ranges']['in_range']:.1%} GMI={summary['gmi']:.2f}% CV={summary['cv']:.1f}% MAGE={summary['mage']:.1f}")
+    if best > args.budget:
+        print(f"FAIL: {best:.3f}s exceeds the {args.budget:.3f}s budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
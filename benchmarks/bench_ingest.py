@@ -0,0 +1,97 @@
+"""Load-test the ingest API with concurrent devices posting reading batches.
+
+Usage: python benchmarks/bench_ingest.py [--devices 16] [--requests 50] [--batch 100]
+
+Starts the ingest server in-process on a free port against a throwaway
+database, then has `--devices` threads, each logged in as its own user and
+holding one keep-alive connection, post `--requests` batches of `--batch`
+readings. Reports readings per second, request latency, and how many
+requests needed a bcrypt check.
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+def device(port, index, requests, batch):
+    auth = base64.b64encode(f"user{index}:correct horse".encode()).decode()
+    headers = {'Authorization': f'Basic {auth}', 'Content-Type': 'application/json'}
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    latencies, inserted = [], 0
+    for r in range(requests):
+        start_ts = 1_700_000_000 + (r * batch) * 300
+        body = json.dumps([
+            {'timestamp': start_ts + i * 300, 'glucose': 90 + (i % 60), 'meal_context': 'Before Breakfast'}
+            for i in range(batch)
+        ])
+        start = time.perf_counter()
+        connection.request('POST', '/v1/readings', body, headers)
+        response = connection.getresponse()
+        payload = json.loads(response.read())
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload}")
+        inserted += payload['inserted']
+    connection.close()
+    return latencies, inserted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.join(tmp, 'bench.db')
+        from database import close_pool, connection
+        from migrations import init_db
+        from cache import cache_stats
+        from health_data import health_writer
+        from ingest_api import make_server
+        from passwords import hash_password, password_service
+
+        init_db()
+        password_hash = hash_password('correct horse')
+        with connection() as conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, name, password) VALUES (?, ?, ?, ?)",
+                ((f"user{i}", f"user{i}@example.com", f"User {i}", password_hash) for i in range(args.devices)),
+            )
+
+        server = make_server('127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.devices) as executor:
+            results = list(executor.map(lambda i: device(port, i, args.requests, args.batch), range(args.devices)))
+        elapsed = time.perf_counter() - start
+
+        server.shutdown()
+        server.server_close()
+        credentials = cache_stats()['credentials']
+        writer = health_writer.stats()
+        health_writer.stop()
+        password_service.shutdown()
+        close_pool()
+
+    latencies = sorted(latency for device_latencies, _ in results for latency in device_latencies)
+    inserted = sum(count for _, count in results)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{inserted} readings in {len(latencies)} requests over {elapsed:.2f}s ({inserted / elapsed:,.0f} readings/s)")
+    print(f"request latency p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+    print(f"bcrypt checks: {credentials['misses']} of {credentials['hits'] + credentials['misses']} requests; "
+          f"writer mean batch {writer['mean_batch_size']:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark reminder delivery throughput against a local stub SMTP server.
+
+Usage: python benchmarks/bench_mailer.py [--messages 2000] [--workers 4] [--batch-size 50] [--connect-ms 50] [--rate 0]
+
+Compares the old one-connection-per-email send with the pooled, batched
+mailer. `--connect-ms` stands in for the TCP, TLS and login cost of a real
+SMTP provider.
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from mailer import Mailer
+from smtp_stub import SMTPStubServer
+
+SENDER = 'bench@example.com'
+
+def send_serially(port, messages):
+    for i in range(messages):
+        msg = MIMEText("This is your BuddyBetes reminder to log your health data.")
+        msg['Subject'] = "Reminder"
+        server = smtplib.SMTP('127.0.0.1', port)
+        server.login(SENDER, 'x')
+        server.sendmail(SENDER, f"user{i}@example.com", msg.as_string())
+        server.quit()
+
+def send_pooled(port, messages, workers, batch_size, rate):
+    mailer = Mailer('127.0.0.1', port, SENDER, 'x', starttls=False, workers=workers, batch_size=batch_size, rate=rate or None)
+    for i in range(messages):
+        mailer.submit(f"user{i}@example.com", "Reminder", "This is your BuddyBetes reminder to log your health data.")
+    mailer.close()
+    return mailer.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--connect-ms', type=float, default=50.0)
+    parser.add_argument('--rate', type=float, default=0.0, help="messages per second limit, 0 for none")
+    parser.add_argument('--serial-messages', type=int, default=200, help="messages for the one-connection-per-email baseline")
+    args = parser.parse_args()
+
+    server = SMTPStubServer(connect_delay=args.connect_ms / 1000).start()
+
+    start = time.perf_counter()
+    send_serially(server.port, args.serial_messages)
+    elapsed = time.perf_counter() - start
+    print(f"serial:  {args.serial_messages} messages in {elapsed:.2f}s ({args.serial_messages / elapsed:,.0f} msgs/s)")
+
+    start = time.perf_counter()
+    stats = send_pooled(server.port, args.messages, args.workers, args.batch_size, args.rate)
+    elapsed = time.perf_counter() - start
+    print(
+        f"pooled:  {stats['sent']} messages in {elapsed:.2f}s ({stats['sent'] / elapsed:,.0f} msgs/s) "
+        f"over {stats['sessions']} SMTP sessions, {stats['failed']} failed"
+    )
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark concurrent logins through the shared password service.
+
+Usage: python benchmarks/bench_passwords.py [--logins 40] [--concurrency 8] [--rounds 12]
+
+Creates users in a throwaway database and logs them in from `--concurrency`
+threads, reporting logins per second. While the logins run, a probe thread
+measures how late a 10 ms sleep wakes up, standing in for how responsive
+other sessions in the server process stay.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+def probe(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        time.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.join(tmp, 'bench.db')
+        os.environ['BUDDYBETES_BCRYPT_ROUNDS'] = str(args.rounds)
+        from database import close_pool, connection
+        from migrations import init_db
+        from auth import authenticate
+        from passwords import hash_password, password_service
+
+        init_db()
+        start = time.perf_counter()
+        password_hash = hash_password('correct horse')
+        print(f"first hash (pool start-up included): {time.perf_counter() - start:.2f}s")
+        with connection() as conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, name, password) VALUES (?, ?, ?, ?)",
+                ((f"user{i}", f"user{i}@example.com", f"User {i}", password_hash) for i in range(args.logins)),
+            )
+
+        stop, lags = threading.Event(), []
+        prober = threading.Thread(target=probe, args=(stop, lags))
+        prober.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            results = list(executor.map(lambda i: authenticate(f"user{i}", 'correct horse', client_ip='127.0.0.1')[0], range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        prober.join()
+        password_service.shutdown()
+        close_pool()
+
+    lags.sort()
+    p95 = lags[int(len(lags) * 0.95)] * 1000 if lags else 0.0
+    print(f"{sum(results)}/{args.logins} logins in {elapsed:.2f}s ({args.logins / elapsed:.1f} logins/s), probe lag p95 {p95:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark cold start of the Streamlit app up to the first paint of the login page.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--budget 1.0]
+
+Each run starts a fresh interpreter, imports Streamlit (already loaded in a
+real server before the app script runs, so reported separately), then runs
+app/run.py once through Streamlit's AppTest harness against a throwaway
+database. Reports the median time to first paint and which heavy libraries
+the login page pulled in; exits non-zero if the median exceeds the budget
+(seconds).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# numpy is left out: Streamlit's own image handling imports it
+HEAVY_MODULES = ('pandas', 'matplotlib', 'passlib', 'pyarrow')
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+painted = time.perf_counter()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps({
+    'streamlit_import': imported - start,
+    'first_paint': painted - imported,
+    'heavy_modules': [name for name in sys.argv[2:] if name in sys.modules],
+}))
+'''
+
+def run_once(env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, os.path.join(ROOT, 'app', 'run.py'), *HEAVY_MODULES],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BUDDYBETES_DB=os.path.join(tmp, 'bench.db'), BUDDYBETES_EMBEDDED_REMINDERS='0')
+        # The first run applies migrations to the empty database; don't time it
+        run_once(env)
+        runs = [run_once(env) for _ in range(args.repeat)]
+
+    first_paint = statistics.median(run['first_paint'] for run in runs)
+    streamlit_import = statistics.median(run['streamlit_import'] for run in runs)
+    print(f"streamlit import: {streamlit_import:.2f}s, login first paint: {first_paint:.2f}s (median of {args.repeat})")
+    print(f"heavy modules loaded: {', '.join(runs[-1]['heavy_modules']) or 'none'}")
+    if first_paint > args.budget:
+        print(f"over budget ({args.budget:.2f}s)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
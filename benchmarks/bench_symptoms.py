@@ -0,0 +1,78 @@
+"""Benchmark the symptoms chart: free-text groupby vs per-day tag counts.
+
+Usage: python benchmarks/bench_symptoms.py [--days 90] [--per-day 6]
+
+Logs `--per-day` readings a day with varied free-text symptoms into a
+throwaway database, then times the old chart (groupby on raw text, one bar
+per reading) against the tag-count chart, and reports the size of the
+matrix each one plots. The old chart takes minutes beyond a few months of history.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+SYMPTOMS = ('headache', 'dizzy', 'tired', 'thirsty', 'blurred vision', 'nausea', 'shaky', 'sweating', 'hungry', 'tingling feet')
+
+def free_text(rng):
+    picked = rng.sample(SYMPTOMS, rng.randint(1, 3))
+    text = ', '.join(picked[:-1]) + (' and ' if len(picked) > 1 else '') + picked[-1]
+    return rng.choice((str.capitalize, str.lower, str.title))(text) + rng.choice(('', '.', ' today'))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--per-day', type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.join(tmp, 'bench.db')
+        import pandas as pd
+        from datetime import date, timedelta
+        from database import close_pool, connection
+        from migrations import init_db
+        from health_data import DASHBOARD_QUERY, day_range_to_timestamps, health_writer, insert_readings
+        from app_pages.analytics import load_symptom_counts
+        from charts import new_figure, render_figure, symptoms_chart
+
+        init_db()
+        with connection() as conn:
+            conn.execute("INSERT INTO users (username, email, name, password) VALUES ('bench', 'b@example.com', 'Bench', 'x')")
+        rng = random.Random(0)
+        start_ts = 1_704_067_200
+        step = 86400 // args.per_day
+        readings = [
+            (start_ts + i * step, 110.0, 120, 80, 'Rice', 'Neutral', free_text(rng), 'Other')
+            for i in range(args.days * args.per_day)
+        ]
+        insert_readings('bench', readings)
+        window = day_range_to_timestamps(date(2024, 1, 1), date(2024, 1, 1) + timedelta(days=args.days - 1))
+
+        start = time.perf_counter()
+        with connection() as conn:
+            df = pd.read_sql_query(DASHBOARD_QUERY, conn, params=('bench', *window))
+        df['datetime'] = pd.to_datetime(df.pop('ts'), unit='s')
+        old_counts = df.groupby(['datetime', 'symptoms']).size().unstack(fill_value=0)
+        fig, ax = new_figure()
+        old_counts.plot(kind='bar', stacked=True, ax=ax, legend=False)
+        render_figure(fig)
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection() as conn:
+            new_counts = load_symptom_counts(conn, 'bench', *window)
+        symptoms_chart(new_counts)
+        new = time.perf_counter() - start
+
+        health_writer.stop()
+        close_pool()
+
+    print(f"free text: {old_counts.shape[0]} x {old_counts.shape[1]} matrix, {old:.2f}s")
+    print(f"tag counts: {new_counts.shape[0]} x {new_counts.shape[1]} matrix, {new:.2f}s")
+
+if __name__ == "__main__":
+    main()
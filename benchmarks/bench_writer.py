@@ -0,0 +1,88 @@
+"""Benchmark concurrent single-reading inserts: per-call transactions vs the group-commit writer.
+
+Usage: python benchmarks/bench_writer.py [--sessions 32] [--inserts 50]
+
+Simulates `--sessions` users logging readings at the same time, each from
+its own thread, against a throwaway database. The direct mode opens a
+transaction per insert as the app used to; the writer mode goes through
+`health_data.insert_readings`. Reports inserts per second, acknowledgment
+latency, "database is locked" failures, and the writer's own stats.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+def reading(i):
+    return (1_700_000_000 + i * 60, 110.0, 120, 80, 'Oatmeal', 'Neutral', '', 'Before Breakfast')
+
+def run(insert, sessions, inserts):
+    latencies, errors, lock = [], [], threading.Lock()
+
+    def session(s):
+        for i in range(inserts):
+            start = time.perf_counter()
+            try:
+                insert(f"user{s}", [reading(s * inserts + i)])
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(sessions) as executor:
+        list(executor.map(session, range(sessions)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    return len(latencies) / elapsed, p95, len(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=32)
+    parser.add_argument('--inserts', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.join(tmp, 'bench.db')
+        from database import close_pool, connection
+        from migrations import init_db
+        from health_data import health_writer, insert_readings, write_readings
+
+        init_db()
+        with connection() as conn:
+            conn.executemany(
+                "INSERT INTO users (username, email, name, password) VALUES (?, ?, ?, ?)",
+                ((f"user{i}", f"user{i}@example.com", f"User {i}", 'x') for i in range(args.sessions)),
+            )
+
+        def direct(username, readings):
+            with connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                write_readings(conn, username, readings)
+
+        for label, insert in (('direct', direct), ('writer', insert_readings)):
+            with connection() as conn:
+                conn.execute('DELETE FROM health_data')
+            rate, p95, errors = run(insert, args.sessions, args.inserts)
+            print(f"{label:>6}: {rate:8.0f} inserts/s, ack p95 {p95:6.1f} ms, {errors} locked errors")
+
+        stats = health_writer.stats()
+        health_writer.stop()
+        close_pool()
+
+    print(
+        f"writer: {stats['batches']} commits, mean batch {stats['mean_batch_size']:.1f}, "
+        f"commit p50 {stats['commit_latency_p50'] * 1000:.1f} ms, p95 {stats['commit_latency_p95'] * 1000:.1f} ms"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Time the app's key paths on a seeded database and emit JSON results.
+
+Usage: python benchmarks/run_suite.py [--users 50] [--days 14] [--repeat 10] [--bulk-rows 50000] [--due 500] [--output results.json]
+
+Seeds a throwaway database with `seed.py` (or uses `--db`, seeding it if
+needed), then times:
+
+- login: `auth.authenticate` with the correct password
+- dashboard: `analytics_dashboard` through Streamlit's AppTest, cold
+  (caches cleared) and warm (an unchanged rerun)
+- single_insert: `health_data.insert_reading`, as the log form calls it
+- bulk_insert: a CSV upload through `bulk_import.import_readings`
+- profile_rename: `auth.update_user_info` plus the reminder reschedule the
+  profile page does, renaming a user and back
+- scheduler_tick: one reminder wave for `--due` users (half of them weekly
+  digests), queued and delivered to a local stub SMTP server
+
+The JSON on stdout (and in `--output`) has run metadata and, per path,
+sample counts and latency percentiles in milliseconds plus throughput
+where it applies, so runs can be diffed for regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+sys.path.insert(0, APP)
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+DASHBOARD_SCRIPT = f'''
+import sys
+sys.path.insert(0, {APP!r})
+import streamlit as st
+from app_pages.analytics import analytics_dashboard
+analytics_dashboard(st.session_state['username'])
+'''
+
+def summarize(samples, **extra):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+        **extra,
+    }
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def bench_login(names, repeat):
+    from auth import authenticate
+    from seed import PASSWORD
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        verified, _, _ = authenticate(names[i % len(names)], PASSWORD)
+        samples.append(time.perf_counter() - start)
+        if not verified:
+            raise RuntimeError("seeded login failed")
+    return summarize(samples)
+
+def bench_dashboard(username, repeat, workdir):
+    from streamlit.testing.v1 import AppTest
+    from cache import analytics_cache, chart_cache
+    script = os.path.join(workdir, 'dashboard.py')
+    with open(script, 'w') as file:
+        file.write(DASHBOARD_SCRIPT)
+    cold, warm = [], []
+    for _ in range(repeat):
+        analytics_cache.clear()
+        chart_cache.clear()
+        at = AppTest.from_file(script, default_timeout=300)
+        at.session_state['username'] = username
+        cold.append(timed(at.run))
+        warm.append(timed(at.run))
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return {'cold': summarize(cold), 'warm': summarize(warm)}
+
+def bench_single_insert(username, repeat):
+    from health_data import insert_reading
+    # Future days, so the readings never collide with seeded ones
+    start_day = datetime.now() + timedelta(days=400)
+    samples = []
+    for i in range(repeat):
+        moment = start_day + timedelta(minutes=i)
+        samples.append(timed(
+            insert_reading, username, moment.date(), moment.time().replace(second=0, microsecond=0),
+            120.0, 120, 80, 'Oatmeal', 'Neutral', '', 'Before Breakfast',
+        ))
+    return summarize(samples)
+
+def bench_bulk_insert(username, rows):
+    from io import BytesIO
+    from bulk_import import import_readings
+    first = int((datetime.now() + timedelta(days=800)).timestamp())
+    data = 'timestamp,glucose,meal_context\n' + ''.join(f'{first + i * 300},{100 + i % 80},Other\n' for i in range(rows))
+    start = time.perf_counter()
+    report = import_readings(username, BytesIO(data.encode()), 'csv')
+    elapsed = time.perf_counter() - start
+    if report['inserted'] != rows:
+        raise RuntimeError(f"bulk import inserted {report['inserted']} of {rows} rows")
+    return {'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_s': round(rows / elapsed)}
+
+def bench_profile_rename(username, repeat):
+    from auth import get_user_info, update_user_info
+    from email_notifications import reschedule_reminder
+    samples = []
+    current = username
+    for i in range(repeat * 2):
+        new = f"{username}-renamed" if current == username else username
+        _, email, name, _, email_reminder, reminder_time = get_user_info(current)
+        start = time.perf_counter()
+        update_user_info(current, new, email, name, email_reminder, reminder_time)
+        reschedule_reminder(new, old_username=current)
+        samples.append(time.perf_counter() - start)
+        current = new
+    return summarize(samples)
+
+def bench_scheduler_tick(due, repeat):
+    import email_notifications
+    from database import connection
+    from mailer import Mailer
+    from seed import REMINDER_TIME
+    from smtp_stub import SMTPStubServer
+
+    server = SMTPStubServer().start()
+    email_notifications.mailer = Mailer(
+        '127.0.0.1', server.port, 'bench@example.com', 'x', starttls=False,
+        on_sent=email_notifications._record_sent, on_failed=email_notifications._record_failed,
+    )
+    names = [f"due{i:05d}" for i in range(due)]
+    with connection() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, email, name, password, email_reminder, reminder_time) VALUES (?, ?, ?, 'x', ?, ?)",
+            ((name, f"{name}@example.com", name, 'Weekly' if i % 2 else 'Daily', REMINDER_TIME) for i, name in enumerate(names)),
+        )
+    wave = [(name, 'Weekly' if i % 2 else 'Daily', REMINDER_TIME) for i, name in enumerate(names)]
+    samples = []
+    try:
+        for _ in range(repeat):
+            # Deliveries are deduplicated per minute; forget the previous wave
+            with connection() as conn:
+                conn.execute('DELETE FROM reminder_deliveries')
+            start = time.perf_counter()
+            email_notifications.send_reminders(wave)
+            email_notifications.mailer.join()
+            samples.append(time.perf_counter() - start)
+        stats = email_notifications.mailer.stats()
+    finally:
+        email_notifications.close_mailer()
+        server.shutdown()
+    if stats['sent'] != due * repeat:
+        raise RuntimeError(f"sent {stats['sent']} of {due * repeat} reminders")
+    return summarize(samples, due=due, emails_per_s=round(due / statistics.median(samples)))
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help="database to use instead of a throwaway one")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--bulk-rows', type=int, default=50000)
+    parser.add_argument('--due', type=int, default=500)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['BUDDYBETES_DB'] = os.path.abspath(args.db) if args.db else os.path.join(tmp, 'bench.db')
+        os.environ.setdefault('BUDDYBETES_EMBEDDED_REMINDERS', '0')
+        from database import close_pool
+        from health_data import health_writer
+        from passwords import password_service
+        from seed import seed
+
+        start = time.perf_counter()
+        names, inserted = seed(args.users, args.days)
+        results = {'seed': {'users': len(names), 'readings_inserted': inserted, 'seconds': round(time.perf_counter() - start, 3)}}
+        try:
+            results['login'] = bench_login(names, args.repeat)
+            results['dashboard'] = bench_dashboard(names[0], args.repeat, tmp)
+            results['single_insert'] = bench_single_insert(names[1], args.repeat * 10)
+            results['bulk_insert'] = bench_bulk_insert(names[1], args.bulk_rows)
+            results['profile_rename'] = bench_profile_rename(names[2], args.repeat)
+            results['scheduler_tick'] = bench_scheduler_tick(args.due, max(1, args.repeat // 5))
+        finally:
+            health_writer.stop()
+            password_service.shutdown()
+            close_pool()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    print(text)
+
+if __name__ == "__main__":
+    main()
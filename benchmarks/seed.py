@@ -0,0 +1,116 @@
+"""Seed a BuddyBetes database with synthetic users and CGM-like readings.
+
+Usage: python benchmarks/seed.py [--db buddybetes.db] [--users 50] [--days 14] [--interval 5] [--seed 0]
+
+Users are named `seed00000`, `seed00001`, ... with the password
+`benchmark`; about a third get daily and a third weekly email reminders at
+08:00. Each user gets a reading every `--interval` minutes: glucose follows
+a personal baseline with post-meal peaks and slow drift, and readings near
+meals carry a meal context, food, mood and sometimes symptoms. Readings go
+through `health_data.insert_readings`, so rollups, symptom tags and alert
+state stay consistent. The `--days` end at today's midnight; re-running
+the same day with the same arguments adds nothing.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+PASSWORD = 'benchmark'
+REMINDER_TIME = '08:00'
+# Meal times in minutes after midnight, with the contexts logged around them
+MEALS = ((480, 'Breakfast'), (750, 'Lunch'), (1140, 'Dinner'))
+FOODS = ('Rice and chicken adobo', 'Oatmeal', 'Pandesal and coffee', 'Fish and vegetables', 'Pancit', 'Salad', 'Fruit')
+SYMPTOMS = ('headache', 'dizzy', 'tired', 'thirsty', 'blurred vision', 'shaky', 'hungry')
+
+def username(index):
+    return f"seed{index:05d}"
+
+def glucose_curve(minutes, rng):
+    """Glucose in mg/dL at each minute offset: baseline, meal peaks, drift and noise."""
+    baseline = rng.normal(115, 15)
+    day_minutes = minutes % 1440
+    meals = sum(
+        rng.uniform(40, 90) * np.exp(-((day_minutes - peak) % 1440) / 90.0) * (((day_minutes - peak) % 1440) < 360)
+        for peak, _ in MEALS
+    )
+    drift = np.cumsum(rng.normal(0, 1.5, len(minutes)))
+    drift -= np.convolve(drift, np.ones(288) / 288, mode='same')
+    return np.clip(baseline + meals + drift + rng.normal(0, 4, len(minutes)), 40, 400).round(1)
+
+def user_readings(rng, start_ts, days, interval):
+    """Readings ordered like health_data.READING_COLUMNS."""
+    minutes = np.arange(0, days * 1440, interval)
+    glucose = glucose_curve(minutes, rng)
+    readings = []
+    for minute, level in zip(minutes.tolist(), glucose.tolist()):
+        day_minute = minute % 1440
+        context = food = mood = symptoms = None
+        bp_systolic = bp_diastolic = 0
+        for meal_minute, meal in MEALS:
+            if 0 <= meal_minute - day_minute < interval:
+                context, food = f"Before {meal}", None
+            elif 0 <= meal_minute + 120 - day_minute < interval:
+                context, food = f"After {meal}", FOODS[rng.integers(len(FOODS))]
+        if context is not None:
+            mood = ('Happy', 'Neutral', 'Neutral', 'Stressed', 'Anxious', 'Sad')[rng.integers(6)]
+            bp_systolic, bp_diastolic = int(rng.normal(125, 12)), int(rng.normal(80, 8))
+            if rng.random() < 0.2:
+                symptoms = ', '.join(rng.choice(SYMPTOMS, size=rng.integers(1, 3), replace=False))
+        readings.append((start_ts + minute * 60, level, bp_systolic, bp_diastolic, food, mood, symptoms, context))
+    return readings
+
+def seed(users, days, interval=5, random_seed=0):
+    """Create the users and their readings; returns (usernames, readings inserted)."""
+    from database import connection
+    from migrations import init_db
+    from health_data import insert_readings
+    from passwords import hash_password
+
+    init_db()
+    password_hash = hash_password(PASSWORD)
+    reminders = ('Daily', 'Weekly', 'None')
+    names = [username(i) for i in range(users)]
+    with connection() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (username, email, name, password, email_reminder, reminder_time) VALUES (?, ?, ?, ?, ?, ?)",
+            ((name, f"{name}@example.com", f"Seed User {i}", password_hash, reminders[i % 3], REMINDER_TIME) for i, name in enumerate(names)),
+        )
+    # Whole days ending at today's midnight, in wall-clock epoch seconds like health_data.ts
+    end_ts = int(time.time()) // 86400 * 86400
+    start_ts = end_ts - days * 86400
+    inserted = 0
+    for i, name in enumerate(names):
+        rng = np.random.default_rng([random_seed, i])
+        inserted += insert_readings(name, user_readings(rng, start_ts, days, interval), skip_duplicates=True)
+    return names, inserted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help="database path (default: BUDDYBETES_DB or ./buddybetes.db)")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--interval', type=int, default=5, help="minutes between readings")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['BUDDYBETES_DB'] = os.path.abspath(args.db)
+    from database import close_pool, get_db_path
+    from health_data import health_writer
+    from passwords import password_service
+
+    start = time.perf_counter()
+    names, inserted = seed(args.users, args.days, args.interval, args.seed)
+    elapsed = time.perf_counter() - start
+    health_writer.stop()
+    password_service.shutdown()
+    close_pool()
+    print(f"seeded {len(names)} users and {inserted:,} new readings into {get_db_path()} in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
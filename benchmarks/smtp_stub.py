@@ -0,0 +1,88 @@
+"""Local stand-in SMTP server for exercising the mailer.
+
+Usage: python benchmarks/smtp_stub.py [--port 8025] [--connect-ms 0] [--message-ms 0]
+
+Speaks just enough SMTP (EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT) for smtplib, accepts any credentials and discards messages after
+counting them. `--connect-ms` delays the greeting to stand in for the TCP,
+TLS and login round trips of a real provider; `--message-ms` delays each
+DATA reply.
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.connect_delay)
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ESMTP")
+        for raw in self.rfile:
+            command = raw.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply("250-stub")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == 'AUTH':
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                time.sleep(server.message_delay)
+                with server.lock:
+                    server.messages += 1
+                self.reply("250 OK queued")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+class SMTPStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), connect_delay=0.0, message_delay=0.0):
+        super().__init__(address, SMTPStubHandler)
+        self.connect_delay = connect_delay
+        self.message_delay = message_delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve from a daemon thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--connect-ms', type=float, default=0.0)
+    parser.add_argument('--message-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = SMTPStubServer(('127.0.0.1', args.port), args.connect_ms / 1000, args.message_ms / 1000)
+    print(f"SMTP stub listening on 127.0.0.1:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{server.messages} messages over {server.connections} connections")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app's modules import each other by bare name, as Streamlit runs them
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
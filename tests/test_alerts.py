@@ -0,0 +1,36 @@
+import sqlite3
+import pytest
+from alerts import CLAIM_TIMEOUT, claim_alerts, mark_dispatched, release_alert
+from migrations import migrate
+
+NOW = 1_718_870_400
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    conn.execute("INSERT INTO users (id, username, name, email, password) VALUES (1, 'ana', 'Ana', 'ana@example.com', 'x')")
+    conn.executemany(
+        "INSERT INTO alert_outbox (user_id, ts, kind, glucose_level, created_at) VALUES (1, ?, 'high', 260, ?)",
+        [(NOW, NOW)] * 3,
+    )
+    yield conn
+    conn.close()
+
+def claimed_ids(conn, now=NOW, limit=500):
+    return [alert[0] for alert in claim_alerts(conn, limit, now)]
+
+def test_claimed_alerts_are_not_claimed_again(conn):
+    assert claimed_ids(conn, limit=2) == [1, 2]
+    assert claimed_ids(conn) == [3]
+    assert claimed_ids(conn) == []
+
+def test_released_and_expired_claims_are_retried(conn):
+    alerts = claim_alerts(conn, now=NOW)
+    assert [attempts for _, attempts, *_ in alerts] == [1, 1, 1]
+    release_alert(conn, 1)
+    mark_dispatched(conn, [2])
+    assert claimed_ids(conn) == [1]
+    # Alert 3's sender never reported back
+    assert claimed_ids(conn, now=NOW + CLAIM_TIMEOUT + 1) == [1, 3]
+    assert claim_alerts(conn, now=NOW + 2 * CLAIM_TIMEOUT + 2)[1][:4] == (3, 3, 'ana@example.com', 'Ana')
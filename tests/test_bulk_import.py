@@ -0,0 +1,33 @@
+import pytest
+from bulk_import import normalize_record, parse_timestamp, resolve_columns
+
+# 2024-06-20 16:00 in Asia/Manila, the app timezone
+MANILA_WALL_CLOCK = parse_timestamp('2024-06-20T16:00:00')
+
+def test_epoch_numbers_are_converted_to_the_app_timezone():
+    # 2024-06-20T08:00:00Z
+    assert parse_timestamp(1718870400) == MANILA_WALL_CLOCK
+    assert parse_timestamp('1718870400000') == MANILA_WALL_CLOCK
+
+def test_iso_strings_with_an_offset_are_converted_to_the_app_timezone():
+    assert parse_timestamp('2024-06-20T08:00:00Z') == MANILA_WALL_CLOCK
+    assert parse_timestamp('2024-06-20T10:00:00+02:00') == MANILA_WALL_CLOCK
+    assert parse_timestamp('2024-06-20T16:00:00+08:00') == MANILA_WALL_CLOCK
+
+def test_naive_iso_strings_keep_the_device_wall_clock():
+    assert parse_timestamp('2024-06-20 16:00:00') == MANILA_WALL_CLOCK
+
+def normalize(**record):
+    record = {'timestamp': '2024-06-20T16:00:00', 'glucose': 112, **record}
+    return normalize_record(record, resolve_columns(record.keys()))
+
+def test_mood_and_meal_context_take_the_log_form_spelling():
+    reading = normalize(mood='happy', meal_context=' before breakfast ')
+    assert reading[5] == 'Happy' and reading[7] == 'Before Breakfast'
+    assert normalize()[5] is None
+
+def test_unknown_mood_or_meal_context_rejects_the_row():
+    with pytest.raises(ValueError, match="unknown meal context 'Fasting'"):
+        normalize(meal_context='Fasting')
+    with pytest.raises(ValueError, match="unknown mood"):
+        normalize(mood='Sleepy')
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from glycemic import glycemic_summary, mage, rollup_summary
+from targets import TARGET_HIGH, TARGET_LOW, VERY_HIGH, VERY_LOW
+
+def sine_week(noise=0.0, seed=0):
+    """Seven days of 5-minute readings swinging 120 mg/dL peak to nadir every 6 hours."""
+    minutes = np.arange(0, 7 * 1440, 5)
+    glucose = 150 + 60 * np.sin(2 * np.pi * minutes / 360)
+    return glucose + np.random.default_rng(seed).normal(0, noise, len(minutes))
+
+def test_mage_of_clean_excursions():
+    assert 115 < mage(sine_week()) <= 120
+
+def test_mage_eliminates_sub_sd_noise():
+    clean = mage(sine_week())
+    noisy = mage(sine_week(noise=3))
+    # Noise may push each peak and nadir out slightly, but must not split excursions
+    assert abs(noisy - clean) < 15
+
+def test_mage_needs_an_excursion():
+    assert np.isnan(mage([120, 120, 120]))
+    assert np.isnan(mage([120, 130]))
+
+def test_summary_drops_blank_glucose():
+    index = pd.date_range('2024-06-20 08:00', periods=4, freq='h')
+    summary = glycemic_summary(pd.Series([100.0, 0.0, 120.0, 0.0], index=index))
+    assert summary['readings'] == 2
+    assert summary['mean'] == 110
+    assert summary['ranges']['below'] == 0
+
+def test_rollup_summary_matches_raw_readings():
+    index = pd.date_range('2024-06-01', periods=96, freq='h')
+    series = pd.Series(np.linspace(50, 300, 96), index=index)
+    days = series.groupby(series.index.normalize())
+    daily = pd.DataFrame({
+        'count': days.count(),
+        'sum': days.sum(),
+        'sumsq': (series * series).groupby(series.index.normalize()).sum(),
+        'very_low': days.agg(lambda day: (day < VERY_LOW).sum()),
+        'below': days.agg(lambda day: (day < TARGET_LOW).sum()),
+        'above': days.agg(lambda day: (day > TARGET_HIGH).sum()),
+        'very_high': days.agg(lambda day: (day > VERY_HIGH).sum()),
+    })
+    raw, rolled = glycemic_summary(series), rollup_summary(daily)
+    for key in ('readings', 'mean', 'sd', 'gmi', 'cv'):
+        assert rolled[key] == pytest.approx(raw[key])
+    assert rolled['ranges'] == pytest.approx(raw['ranges'])
+    np.testing.assert_allclose(rolled['daily'][['mean', 'std']], raw['daily'][['mean', 'std']])
+
+def test_rollup_summary_of_an_empty_window_is_blank():
+    daily = pd.DataFrame(columns=['count', 'sum', 'sumsq', 'very_low', 'below', 'above', 'very_high'])
+    summary = rollup_summary(daily)
+    assert summary['readings'] == 0
+    assert np.isnan(summary['mean']) and summary['daily'].empty
@@ -0,0 +1,70 @@
+import sqlite3
+import time
+import pytest
+import database
+from database import close_pool, connection
+from writer import GroupCommitWriter, WriterBusy
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'writer.db')
+    monkeypatch.setenv('BUDDYBETES_DB', path)
+    monkeypatch.setattr(database, 'BUSY_TIMEOUT_MS', 100)
+    with connection() as conn:
+        conn.execute('CREATE TABLE items (value INTEGER NOT NULL)')
+    yield path
+    close_pool()
+
+def insert_item(conn, value):
+    conn.execute('INSERT INTO items (value) VALUES (?)', (value,))
+    return value
+
+def stored_items():
+    with connection() as conn:
+        return sorted(value for value, in conn.execute('SELECT value FROM items'))
+
+def test_call_returns_after_commit(db_path):
+    writer = GroupCommitWriter(insert_item)
+    try:
+        assert [writer.call(value) for value in range(3)] == [0, 1, 2]
+    finally:
+        writer.stop()
+    assert stored_items() == [0, 1, 2]
+
+def test_failing_request_fails_alone(db_path):
+    writer = GroupCommitWriter(insert_item, linger=0.05)
+    try:
+        futures = [writer.submit(value) for value in (1, None, 2)]
+        assert futures[0].result(5) == 1
+        assert isinstance(futures[1].exception(5), sqlite3.IntegrityError)
+        assert futures[2].result(5) == 2
+    finally:
+        writer.stop()
+    assert stored_items() == [1, 2]
+
+def test_failed_transaction_fails_every_request(db_path):
+    holder = sqlite3.connect(db_path)
+    holder.execute('BEGIN IMMEDIATE')
+    writer = GroupCommitWriter(insert_item, linger=0.05)
+    try:
+        futures = [writer.submit(value) for value in range(3)]
+        for future in futures:
+            assert isinstance(future.exception(5), sqlite3.OperationalError)
+        assert writer.stats()['failures'] == 3
+    finally:
+        holder.rollback()
+        holder.close()
+        writer.stop()
+    assert stored_items() == []
+
+def test_call_gives_up_after_timeout(db_path):
+    def slow_insert(conn, value):
+        time.sleep(0.5)
+        return insert_item(conn, value)
+
+    writer = GroupCommitWriter(slow_insert)
+    try:
+        with pytest.raises(WriterBusy):
+            writer.call(1, timeout=0.05)
+    finally:
+        writer.stop()